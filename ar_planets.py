@@ -1,9 +1,17 @@
 
+import json
 import streamlit as st
 import streamlit.components.v1 as components
+import geo_client
+import sky_cache
+import orientation_filter
 
 st.title("Orientation")
 
+lat, lon, location_source = geo_client.observer_location()
+planets = sky_cache.get_position_cache().get(lat, lon)
+renderer = sky_cache.renderer_mode()
+
 # JavaScript for Device Orientation, Camera Access, and API Call
 orientation_js = """
 <!DOCTYPE html>
@@ -20,6 +28,7 @@ orientation_js = """
     <div id="container"></div>
     <script src="https://cdnjs.cloudflare.com/ajax/libs/three.js/r146/three.min.js"></script>
     <script src="https://cdn.jsdelivr.net/npm/three/examples/js/renderers/CSS3DRenderer.js"></script>
+    __ORIENTATION_FILTER__
     <script>
         // Camera feed setup
 async function startCamera() {
@@ -44,12 +53,30 @@ startCamera()
 const container = document.getElementById('container');
 const scene = new THREE.Scene();
 const camera = new THREE.PerspectiveCamera(75, window.innerWidth / window.innerHeight, 0.1, 1000);
-const renderer = new THREE.CSS3DRenderer();
+camera.updateMatrixWorld();
+
+// 'canvas' draws every marker and label in one 2D canvas pass; 'dom' keeps a CSS3DObject per planet
+const canvas = document.createElement('canvas');
+const context = '__RENDERER__' === 'canvas' ? canvas.getContext('2d') : null;
+const canvasMode = !!context;
+const renderer = canvasMode ? {
+    domElement: canvas,
+    setSize(width, height) {
+        const ratio = window.devicePixelRatio || 1;
+        canvas.width = Math.round(width * ratio);
+        canvas.height = Math.round(height * ratio);
+        canvas.style.width = `${width}px`;
+        canvas.style.height = `${height}px`;
+        context.setTransform(ratio, 0, 0, ratio, 0, 0);
+    },
+    render() { drawMarkers(); }
+} : new THREE.CSS3DRenderer();
 renderer.setSize(window.innerWidth, window.innerHeight);
 container.appendChild(renderer.domElement);
 
 // Device orientation setup
 let alpha = 0, beta = 0, gamma = 0;
+const filter = OrientationFilter();
 if (typeof DeviceOrientationEvent !== 'undefined' && DeviceOrientationEvent.requestPermission) {
     DeviceOrientationEvent.requestPermission()
         .then(permissionState => {
@@ -62,21 +89,39 @@ if (typeof DeviceOrientationEvent !== 'undefined' && DeviceOrientationEvent.requ
     window.addEventListener('deviceorientation', handleOrientation);
 }
 
+// Every reading goes into the filter, repeated ones included, so it can settle and stop
+// predicting; render() skips the frame when the sampled pose has not moved
+let settleTimer = null;
+
 function handleOrientation(event) {
     alpha = event.alpha || 0; // Compass direction (0-360)
     beta = event.beta || 0;   // Front/back tilt (-180 to 180)
     gamma = event.gamma || 0; // Left/right tilt (-90 to 90)
+    filter.push(alpha, beta, gamma, event.timeStamp || performance.now());
+    invalidate();
+    clearTimeout(settleTimer);
+    settleTimer = setTimeout(invalidate, filter.predictionWindowMs + 1);
 }
 
-// Planet data
-const planetsData = [
-    { name: 'Venus', azimuth: 45, altitude: 30, radius: 10 },
-    { name: 'Mars', azimuth: 120, altitude: 20, radius: 8 },
-    // Add more planets
-];
+// Planet data computed on the server; radius in px grows with the planet's mean radius
+const planetsData = __PLANETS__.map(p => ({ ...p, radius: 4 + Math.sqrt(p.meanradius) / 20 }));
+
+// Convert azimuth/altitude to 3D coordinates
+function sphericalToCartesian(azimuth, altitude, radius) {
+    const phi = THREE.MathUtils.degToRad(90 - altitude);
+    const theta = THREE.MathUtils.degToRad(azimuth);
+    return new THREE.Vector3(
+        radius * Math.sin(phi) * Math.cos(theta),
+        radius * Math.sin(phi) * Math.sin(theta),
+        radius * Math.cos(phi)
+    );
+}
 
-// Create planet elements
+// Create planet markers; their unrotated positions only change with the planet data
 const planets = planetsData.map(planet => {
+    const base = sphericalToCartesian(planet.azimuth, planet.altitude, 100);
+    if (canvasMode) return { ...planet, marker: { position: new THREE.Vector3() }, base };
+
     const div = document.createElement('div');
     div.className = 'planet';
     div.style.width = `${planet.radius * 2}px`;
@@ -85,60 +130,102 @@ const planets = planetsData.map(planet => {
     div.style.borderRadius = '50%';
     div.textContent = planet.name;
 
-    const cssObject = new THREE.CSS3DObject(div);
-    cssObject.position.set(0, 0, 0); // Initial position
-    scene.add(cssObject);
-    return { ...planet, cssObject };
+    const marker = new THREE.CSS3DObject(div);
+    scene.add(marker);
+    return { ...planet, marker, base };
 });
 
-// Convert azimuth/altitude to 3D coordinates
-function sphericalToCartesian(azimuth, altitude, radius) {
-    const phi = THREE.MathUtils.degToRad(90 - altitude);
-    const theta = THREE.MathUtils.degToRad(azimuth);
-    const x = radius * Math.sin(phi) * Math.cos(theta);
-    const y = radius * Math.sin(phi) * Math.sin(theta);
-    const z = radius * Math.cos(phi);
-    return { x, y, z };
+// Canvas mode: project every marker, then fill all discs in one path and draw the labels
+const projected = new THREE.Vector3();
+const screenX = new Float32Array(planets.length);
+const screenY = new Float32Array(planets.length);
+const onScreen = new Uint8Array(planets.length);
+
+function drawMarkers() {
+    const width = window.innerWidth, height = window.innerHeight;
+    context.clearRect(0, 0, width, height);
+    context.beginPath();
+    planets.forEach((planet, i) => {
+        projected.copy(planet.marker.position).project(camera);
+        onScreen[i] = projected.z < 1 && Math.abs(projected.x) < 1.2 && Math.abs(projected.y) < 1.2 ? 1 : 0;
+        if (!onScreen[i]) return;
+        screenX[i] = (projected.x + 1) / 2 * width;
+        screenY[i] = (1 - projected.y) / 2 * height;
+        context.moveTo(screenX[i] + planet.radius, screenY[i]);
+        context.arc(screenX[i], screenY[i], planet.radius, 0, 2 * Math.PI);
+    });
+    context.fillStyle = 'rgba(255, 255, 0, 0.5)';
+    context.fill();
+
+    context.font = '12px sans-serif';
+    context.textAlign = 'center';
+    context.textBaseline = 'middle';
+    context.fillStyle = '#000';
+    planets.forEach((planet, i) => {
+        if (onScreen[i]) context.fillText(planet.name, screenX[i], screenY[i]);
+    });
 }
 
-// Update planet positions based on device orientation
-function updatePlanets() {
-    planets.forEach(planet => {
-        const { x, y, z } = sphericalToCartesian(planet.azimuth, planet.altitude, 100);
+// One rotation shared by every planet, taken from the filtered orientation once per rendered frame
+const rotation = new THREE.Quaternion();
 
-        // Apply device orientation
-        const euler = new THREE.Euler(
-            THREE.MathUtils.degToRad(beta),  // Tilt front/back
-            THREE.MathUtils.degToRad(alpha), // Compass direction
-            THREE.MathUtils.degToRad(gamma), // Tilt left/right
-            'YXZ' // Order of rotations
-        );
+function updatePlanets(q) {
+    rotation.set(q[0], q[1], q[2], q[3]);
+    planets.forEach(planet => {
+        planet.marker.position.copy(planet.base).applyQuaternion(rotation);
+    });
+}
 
-        const vector = new THREE.Vector3(x, y, z);
-        vector.applyEuler(euler);
+// Render only when orientation, planet data or viewport changed, and never while hidden
+let dirty = true;
+let frameRequested = false;
 
-        // Update planet position
-        planet.cssObject.position.copy(vector);
-    });
+function invalidate() {
+    dirty = true;
+    if (!frameRequested && !document.hidden) {
+        frameRequested = true;
+        requestAnimationFrame(render);
+    }
 }
 
-// Animation loop
-function animate() {
-    requestAnimationFrame(animate);
-    updatePlanets();
+function render() {
+    frameRequested = false;
+    if (!dirty || document.hidden) return;
+    dirty = false;
+    // Pixels per radian of the camera's vertical field of view
+    const pixelsPerRadian = window.innerHeight / 2 / Math.tan(THREE.MathUtils.degToRad(camera.fov) / 2);
+    const q = filter.sample(performance.now(), pixelsPerRadian);
+    if (!q) return; // moved less than the pixel threshold
+    updatePlanets(q);
     renderer.render(scene, camera);
 }
-animate();
+
+document.addEventListener('visibilitychange', () => {
+    if (!document.hidden) {
+        filter.invalidate();
+        invalidate();
+    }
+});
+invalidate();
 
 // Handle window resize
 window.addEventListener('resize', () => {
     camera.aspect = window.innerWidth / window.innerHeight;
     camera.updateProjectionMatrix();
+    camera.updateMatrixWorld();
     renderer.setSize(window.innerWidth, window.innerHeight);
+    filter.invalidate();
+    invalidate();
 });
     </script>
 </body>
 </html>"""
 
 # Embed the JavaScript and HTML into the Streamlit app
-components.html(orientation_js, height=1600)
+components.html(
+    orientation_js
+    .replace("__ORIENTATION_FILTER__", orientation_filter.script())
+    .replace("__PLANETS__", json.dumps(planets))
+    .replace("__RENDERER__", renderer),
+    height=1600
+)
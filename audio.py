@@ -1,131 +1,419 @@
 import streamlit as st
-import subprocess
-import shutil
+import numpy as np
 from pathlib import Path
-from TTS.api import TTS
-from pydub import AudioSegment
 import tempfile
 import os
+from collections import OrderedDict
+import models
+import profiling
+import streaming
+import jobs
+from cache import ResultCache, content_hash
 
-def separate_vocals(song_path, output_dir):
-    """Separate vocals using Demucs"""
+def demix(model, wav):
+    """Split a (channels, frames) tensor into vocals and accompaniment with a loaded Demucs model"""
+    import torch
+    from demucs.apply import apply_model
+
+    ref = wav.mean(0)
+    mean, std = ref.mean(), ref.std()
+    with torch.no_grad():
+        sources = apply_model(model, ((wav - mean) / std)[None], device="cpu", progress=False)[0]
+    sources = sources * std + mean
+
+    vocals = sources[model.sources.index("vocals")]
+    accompaniment = sources.sum(0) - vocals
+    return vocals.numpy(), accompaniment.numpy()
+
+def resample(samples, from_rate, to_rate, channels):
+    """Resample float samples shaped (channels, frames) and match the channel count"""
+    import torch
+    from demucs.audio import convert_audio
+
+    tensor = torch.from_numpy(np.atleast_2d(samples))
+    return convert_audio(tensor, from_rate, to_rate, channels).numpy()
+
+VOICE_SAMPLE_SECONDS = float(os.environ.get("AUDIO_VOICE_SAMPLE_SECONDS", 30))
+
+@profiling.stage("decode_song")
+def decode_song(song_bytes):
+    """Decode uploaded song bytes straight to PCM at the rate and channel count Demucs expects"""
     try:
-        subprocess.run(
-            ["demucs", "--two-stems=vocals", str(song_path), "-o", str(output_dir)],
-            check=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
-        
-        song_name = song_path.stem
-        model_dir = output_dir / "htdemucs" / song_name
-        
-        shutil.copy(model_dir / "vocals.wav", output_dir / "vocals.wav")
-        shutil.copy(model_dir / "no_vocals.wav", output_dir / "accompaniment.wav")
-        
-        shutil.rmtree(output_dir / "htdemucs")
-        
-    except subprocess.CalledProcessError as e:
-        st.error(f"Error during vocal separation: {e.stderr.decode()}")
-        raise e
+        model = models.get_model("demucs")
+        return streaming.decode_audio(song_bytes, model.samplerate, model.audio_channels)
     except Exception as e:
-        st.error(f"An error occurred during vocal separation: {str(e)}")
+        st.error(f"Error decoding the song: {str(e)}")
         raise e
 
-def convert_mp3_to_wav(mp3_path, wav_path):
-    """Convert audio format from MP3 to WAV"""
+@profiling.stage("decode_voice_sample")
+def decode_voice_sample(sample_bytes):
+    """Decode the uploaded voice sample to mono PCM at FreeVC's input rate, keeping only the part it uses"""
     try:
-        audio = AudioSegment.from_mp3(mp3_path)
-        audio.export(wav_path, format="wav")
+        vc_model = models.get_model("freevc").voice_converter.vc_model
+        rate = vc_model.config.audio.input_sample_rate
+        return streaming.decode_audio(sample_bytes, rate, 1, VOICE_SAMPLE_SECONDS)[0]
     except Exception as e:
-        st.error(f"Error converting MP3 to WAV: {str(e)}")
+        st.error(f"Error decoding the voice sample: {str(e)}")
         raise e
 
-def generate_voice(vocal_track_path, voice_sample_path, output_path):
-    """Generate voice conversion using TTS"""
+@profiling.stage("separate_vocals")
+def separate_vocals(song):
+    """Separate vocals and accompaniment in memory using Demucs"""
     try:
-        tts = TTS(
-            model_name="voice_conversion_models/multilingual/vctk/freevc24",
-            progress_bar=False,
-            gpu=False
-        )
-        tts.voice_conversion_to_file(
-            source_wav=str(vocal_track_path),
-            target_wav=str(voice_sample_path),
-            file_path=str(output_path)
+        import torch
+
+        model = models.get_model("demucs")
+        vocals, accompaniment = demix(model, torch.from_numpy(song))
+        return vocals, accompaniment, model.samplerate
+
+    except Exception as e:
+        st.error(f"An error occurred during vocal separation: {str(e)}")
+        raise e
+
+SPEAKER_MEMORY_SIZE = 64
+_speakers = OrderedDict()
+
+@profiling.stage("speaker_embedding")
+def speaker_embedding(voice_sample):
+    """Compute FreeVC's target-speaker embedding from a decoded voice sample"""
+    import librosa
+    import torch
+
+    vc_model = models.get_model("freevc").voice_converter.vc_model
+    wav, _ = librosa.effects.trim(voice_sample, top_db=20)
+    with torch.inference_mode():
+        if vc_model.config.model_args.use_spk:
+            return vc_model.enc_spk_ex.embed_utterance(wav)[None, :, None]
+
+        from TTS.vc.modules.freevc.mel_processing import mel_spectrogram_torch
+        audio_config = vc_model.config.audio
+        mel = mel_spectrogram_torch(
+            torch.from_numpy(wav)[None].to(vc_model.device),
+            audio_config.filter_length,
+            audio_config.n_mel_channels,
+            audio_config.input_sample_rate,
+            audio_config.hop_length,
+            audio_config.win_length,
+            audio_config.mel_fmin,
+            audio_config.mel_fmax,
         )
+        return vc_model.enc_spk.embed_utterance(mel.transpose(1, 2)).unsqueeze(-1).cpu().numpy()
+
+def get_speaker_embedding(sample_bytes, cache):
+    """Speaker embedding for an uploaded voice sample, from memory, then disk, then computed"""
+    key = content_hash(sample_bytes, models.model_version("freevc"), str(VOICE_SAMPLE_SECONDS))
+    if key in _speakers:
+        _speakers.move_to_end(key)
+        return _speakers[key]
+
+    stored = cache.get_arrays("speakers", key)
+    if stored is not None:
+        embedding = stored["embedding"]
+    else:
+        embedding = speaker_embedding(decode_voice_sample(sample_bytes))
+        cache.put_arrays("speakers", key, embedding=embedding)
+
+    _speakers[key] = embedding
+    if len(_speakers) > SPEAKER_MEMORY_SIZE:
+        _speakers.popitem(last=False)
+    return embedding
+
+@profiling.stage("generate_voice")
+def generate_voice(vocals, samplerate, speaker):
+    """Generate voice conversion using TTS and a precomputed speaker embedding"""
+    try:
+        import torch
+
+        converter = models.get_model("freevc").voice_converter
+        vc_model = converter.vc_model
+        source = resample(vocals, samplerate, vc_model.config.audio.input_sample_rate, 1)[0]
+        with torch.inference_mode():
+            g = torch.from_numpy(speaker).to(vc_model.device)
+            c = vc_model.extract_wavlm_features(torch.from_numpy(source).to(vc_model.device)[None, :])
+            if vc_model.config.model_args.use_spk:
+                converted = vc_model.inference(c, g=g)
+            else:
+                # inference() would recompute g from a mel, so run its decoder steps directly
+                c_lengths = torch.full((1,), c.size(-1), device=c.device)
+                z_p, _, _, c_mask = vc_model.enc_p(c, c_lengths)
+                z = vc_model.flow(z_p, c_mask, g=g, reverse=True)
+                converted = vc_model.dec(z * c_mask, g=g)
+        return converted[0][0].cpu().float().numpy(), converter.output_sample_rate
     except Exception as e:
         st.error(f"Error generating new vocals: {str(e)}")
         raise e
 
-def mix_tracks(instrumental_track_path, vocal_track_path, final_output_path):
-    """Mix instrumental and vocal tracks"""
+MIX_BLOCK_FRAMES = 2**18
+
+def mix_into(instrumental, vocals, instrumental_gain=1.0, vocals_gain=1.0):
+    """Add vocals into the instrumental buffer in place, one block at a time"""
+    if vocals.shape[0] != instrumental.shape[0] and vocals.shape[0] != 1:
+        vocals = vocals.mean(0, keepdims=True)
+    frames = min(instrumental.shape[-1], vocals.shape[-1])
+    for start in range(0, instrumental.shape[-1], MIX_BLOCK_FRAMES):
+        block = instrumental[:, start:start + MIX_BLOCK_FRAMES]
+        if instrumental_gain != 1.0:
+            block *= instrumental_gain
+        end = min(start + MIX_BLOCK_FRAMES, frames)
+        if end > start:
+            voice = vocals[:, start:end]
+            block[:, :end - start] += voice if vocals_gain == 1.0 else voice * vocals_gain
+    return instrumental
+
+@profiling.stage("mix_tracks")
+def mix_tracks(instrumental, instrumental_rate, vocals, vocals_rate, final_output_path,
+               instrumental_gain=1.0, vocals_gain=1.0, ceiling=0.99):
+    """Mix vocals into the instrumental buffer in place, then limit and encode it to MP3"""
     try:
-        instrumental = AudioSegment.from_wav(str(instrumental_track_path))
-        vocals = AudioSegment.from_wav(str(vocal_track_path))
-        mixed = instrumental.overlay(vocals)
-        mixed.export(final_output_path, format="mp3")
+        mixed = np.atleast_2d(instrumental)
+        if mixed.dtype != np.float32:
+            mixed = mixed.astype(np.float32)
+        vocals = np.atleast_2d(vocals)
+        if vocals_rate != instrumental_rate:
+            vocals = resample(vocals, vocals_rate, instrumental_rate, mixed.shape[0])
+        mix_into(mixed, vocals, instrumental_gain, vocals_gain)
+
+        peak = max(float(mixed.max(initial=0.0)), -float(mixed.min(initial=0.0)))
+        scale = ceiling / peak if peak > ceiling else 1.0
+        with streaming.Mp3Encoder(final_output_path, instrumental_rate, mixed.shape[0]) as encoder:
+            for start in range(0, mixed.shape[-1], MIX_BLOCK_FRAMES):
+                block = mixed[:, start:start + MIX_BLOCK_FRAMES]
+                encoder.write(block if scale == 1.0 else block * scale)
     except Exception as e:
         st.error(f"Error mixing tracks: {str(e)}")
         raise e
 
+def stream_convert(song, speaker, window_seconds=30.0, overlap_seconds=2.0):
+    """Separate, convert and mix a song window by window, yielding mixed audio as soon as it is final"""
+    import torch
+
+    model = models.get_model("demucs")
+    rate, channels = model.samplerate, model.audio_channels
+    overlap = int(overlap_seconds * rate)
+    block_frames = max(int(window_seconds * rate) - overlap, 1)
+
+    crossfade = streaming.OverlapAdd(overlap)
+    blocks = streaming.decode_blocks(song, rate, channels, block_frames)
+    for window in streaming.overlapping_windows(blocks, overlap):
+        vocals, accompaniment = demix(model, torch.from_numpy(window.copy()))
+        new_vocals, new_vocals_rate = generate_voice(vocals, rate, speaker)
+        new_vocals = resample(new_vocals, new_vocals_rate, rate, channels)
+
+        finished = crossfade.push(mix_into(accompaniment, new_vocals))
+        if finished.shape[-1]:
+            yield finished
+
+    tail = crossfade.flush()
+    if tail is not None and tail.shape[-1]:
+        yield tail
+
+PIPELINE_STAGES = ("decode", "separate", "convert", "mix")
+
+def cache_keys(song_bytes, sample_bytes, mix_variant="mp3"):
+    """Content-addressed keys for each cached layer of the pipeline"""
+    stems = content_hash(song_bytes, models.model_version("demucs"))
+    vocals = content_hash(stems, sample_bytes, models.model_version("freevc"), str(VOICE_SAMPLE_SECONDS))
+    return {"stems": stems, "vocals": vocals, "mix": content_hash(vocals, mix_variant)}
+
+def process_whole(song_bytes, sample_bytes, final_output, cache, keys, report):
+    """Run the pipeline on the whole song at once, reusing cached layers"""
+    stems = cache.get_arrays("stems", keys["stems"])
+    if stems is not None:
+        report("separate", "Reusing separated vocals and instrumentals from cache...")
+        vocals, accompaniment = stems["vocals"], stems["accompaniment"]
+        song_rate = int(stems["samplerate"])
+    else:
+        report("decode", "Decoding the song...")
+        song = decode_song(song_bytes)
+        report("separate", "Separating vocals and instrumentals...")
+        vocals, accompaniment, song_rate = separate_vocals(song)
+        del song
+        cache.put_arrays(
+            "stems", keys["stems"], pcm16=("vocals", "accompaniment"),
+            vocals=vocals, accompaniment=accompaniment, samplerate=song_rate
+        )
+
+    converted = cache.get_arrays("vocals", keys["vocals"])
+    if converted is not None:
+        report("convert", "Reusing converted vocals from cache...")
+        new_vocals, new_vocals_rate = converted["vocals"], int(converted["samplerate"])
+    else:
+        report("decode", "Preparing the voice sample...")
+        speaker = get_speaker_embedding(sample_bytes, cache)
+        report("convert", "Generating new vocals...")
+        new_vocals, new_vocals_rate = generate_voice(vocals, song_rate, speaker)
+        cache.put_arrays("vocals", keys["vocals"], pcm16=("vocals",), vocals=new_vocals, samplerate=new_vocals_rate)
+
+    report("mix", "Mixing tracks...")
+    mix_tracks(accompaniment, song_rate, new_vocals, new_vocals_rate, final_output)
+
+def process_streaming(song_bytes, sample_bytes, final_output, cache, window_seconds, overlap_seconds, report):
+    """Run the pipeline window by window, handing the first finished audio out as an MP3 preview"""
+    model = models.get_model("demucs")
+    rate, channels = model.samplerate, model.audio_channels
+    report("decode", "Preparing the voice sample...")
+    speaker = get_speaker_embedding(sample_bytes, cache)
+    report("separate", "Separating, converting and mixing in windows...")
+    done = 0
+    with streaming.Mp3Encoder(final_output, rate, channels) as encoder:
+        for block in stream_convert(song_bytes, speaker, window_seconds, overlap_seconds):
+            encoder.write(block)
+            preview = None
+            if done == 0:
+                # encoded once here, so the UI never moves or re-encodes raw float samples
+                preview_path = Path(final_output).with_name("preview.mp3")
+                with streaming.Mp3Encoder(preview_path, rate, channels) as preview_encoder:
+                    preview_encoder.write(block)
+                preview = preview_path.read_bytes()
+            done += block.shape[-1]
+            report("mix", f"Converted {done / rate:.0f}s of audio", preview)
+
+def ignore_progress(stage, message, preview=None):
+    pass
+
+def run_pipeline(song_bytes, sample_bytes, stream=False, window_seconds=30.0, overlap_seconds=2.0,
+                 cache=None, report=ignore_progress):
+    """Run separate -> convert -> mix on uploaded MP3 bytes and return the final MP3 bytes"""
+    cache = cache or ResultCache()
+    mix_variant = f"stream-{window_seconds}-{overlap_seconds}" if stream else "mp3"
+    keys = cache_keys(song_bytes, sample_bytes, mix_variant)
+
+    result = cache.get_bytes("mix", keys["mix"])
+    if result is not None:
+        report("mix", "This song and voice sample were already converted - loaded from cache.")
+        return result
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        final_output = Path(tmpdir) / "final_output.mp3"
+        if stream:
+            process_streaming(song_bytes, sample_bytes, final_output, cache, window_seconds, overlap_seconds, report)
+        else:
+            process_whole(song_bytes, sample_bytes, final_output, cache, keys, report)
+
+        result = final_output.read_bytes()
+
+    cache.put_bytes("mix", keys["mix"], result)
+    return result
+
+@st.cache_resource
+def get_job_queue():
+    """Worker pool shared by every session of this server"""
+    return jobs.JobQueue()
+
+def show_model_stats(worker_stats):
+    """Show how long each worker's resident models took to load and how much memory they hold"""
+    with st.expander("Loaded models"):
+        for worker, stats in worker_stats.items():
+            for name, model in stats.items():
+                st.write(
+                    f"{worker} {name}: loaded in {model['load_seconds']:.1f}s, "
+                    f"{model['rss_bytes'] / 2**20:.0f} MiB resident"
+                )
+
+def show_profile(records, cprofile_dump=None):
+    """Show wall time, CPU time and peak memory of each profiled stage"""
+    with st.expander("Stage timings"):
+        st.table([
+            {
+                "stage": record["stage"],
+                "wall (s)": round(record["wall_seconds"], 2),
+                "CPU (s)": round(record["cpu_seconds"], 2),
+                "peak RSS (MiB)": round(record["peak_rss_bytes"] / 2**20),
+            }
+            for record in records
+        ])
+        if cprofile_dump:
+            st.download_button("Download cProfile dump", data=cprofile_dump, file_name="audio.prof")
+
+FINISHED_STATES = ("done", "failed")
+
+def show_job(queue, job_id, status):
+    """Show a submitted job's progress, preview and result"""
+    stage = status.get("stage")
+    if status["state"] in ("queued", "running"):
+        done = PIPELINE_STAGES.index(stage) if stage else 0
+        st.progress(done / len(PIPELINE_STAGES), text=status["message"])
+    if "profile" in status:
+        show_profile(status["profile"], status.get("cprofile"))
+    else:
+        for name, seconds in jobs.stage_durations(status).items():
+            st.write(f"{name}: {seconds:.1f}s")
+
+    if status.get("has_preview") and status["state"] != "done":
+        preview_key = f"preview:{job_id}"
+        if preview_key not in st.session_state:
+            st.session_state[preview_key] = queue.preview(job_id)
+        st.write("First converted section:")
+        st.audio(st.session_state[preview_key], format="audio/mpeg")
+
+    if status["state"] == "failed":
+        st.error(f"An error occurred during processing: {status['error']}")
+    elif status["state"] == "done":
+        st.success("Processing complete!")
+        st.download_button(
+            "Download Converted Song",
+            data=queue.result(job_id),
+            file_name="converted_song.mp3",
+            mime="audio/mpeg",
+            type="primary"
+        )
+
+@st.fragment(run_every=2)
+def poll_job(queue, job_id):
+    """Poll a running job; once it finishes, rerun the page so the final state is drawn without polling"""
+    status = queue.status(job_id)
+    if status is None or status["state"] in FINISHED_STATES:
+        st.rerun()
+    show_job(queue, job_id, status)
+
 def main():
     st.title("🎵 Song Voice Conversion Tool")
     st.markdown("Upload a sample voice and a song to create a new version with the converted voice!")
+    queue = get_job_queue()
 
     with st.form("upload_form"):
         sample_voice = st.file_uploader("Sample Voice (MP3)", type=["mp3"])
         original_song = st.file_uploader("Original Song (MP3)", type=["mp3"])
+        stream_mode = st.checkbox("Stream long songs in windows (bounded memory)")
+        capture_profile = st.checkbox("Capture a cProfile dump of this run")
+        window_seconds = st.slider("Window length (s)", 10, 120, 30)
+        overlap_seconds = st.slider("Window overlap (s)", 0.5, 5.0, 2.0)
         submitted = st.form_submit_button("Process Files")
 
     if submitted and sample_voice and original_song:
-        with tempfile.TemporaryDirectory() as tmpdir:
-            tmp_path = Path(tmpdir)
-            
-            try:
-                # Save uploaded files
-                sample_path = tmp_path / "sample_voice.mp3"
-                sample_path.write_bytes(sample_voice.getvalue())
-                
-                original_path = tmp_path / "original_song.mp3"
-                original_path.write_bytes(original_song.getvalue())
-
-                # Processing steps
-                with st.status("Processing...", expanded=True) as status:
-                    st.write("Separating vocals and instrumentals...")
-                    output_dir = tmp_path / "output"
-                    output_dir.mkdir()
-                    separate_vocals(original_path, output_dir)
-
-                    st.write("Converting sample voice to WAV...")
-                    voice_sample_wav = tmp_path / "voice_sample.wav"
-                    convert_mp3_to_wav(sample_path, voice_sample_wav)
-
-                    st.write("Generating new vocals...")
-                    new_vocals_path = tmp_path / "new_vocals.wav"
-                    generate_voice(output_dir / "vocals.wav", voice_sample_wav, new_vocals_path)
-
-                    st.write("Mixing tracks...")
-                    final_output = tmp_path / "final_output.mp3"
-                    mix_tracks(output_dir / "accompaniment.wav", new_vocals_path, final_output)
-
-                    status.update(label="Processing complete!", state="complete")
-
-                # Provide download
-                with open(final_output, "rb") as f:
-                    st.download_button(
-                        "Download Converted Song",
-                        data=f,
-                        file_name="converted_song.mp3",
-                        mime="audio/mpeg",
-                        type="primary"
-                    )
-            
-            except Exception as e:
-                st.error(f"An error occurred during processing: {str(e)}")
+        if "job_id" in st.session_state:
+            previous = st.session_state.pop("job_id")
+            st.session_state.pop(f"preview:{previous}", None)
+            queue.forget(previous)
+        try:
+            st.session_state["job_id"] = queue.submit(
+                original_song.getvalue(),
+                sample_voice.getvalue(),
+                stream=stream_mode,
+                window_seconds=window_seconds,
+                overlap_seconds=overlap_seconds,
+                cprofile=capture_profile
+            )
+        except jobs.QueueFull as e:
+            st.error(str(e))
 
     elif submitted:
         st.error("Please upload both files before processing")
 
+    job_id = st.session_state.get("job_id")
+    if job_id:
+        status = queue.status(job_id)
+        if status is None:  # expired on the server
+            st.session_state.pop("job_id")
+            st.session_state.pop(f"preview:{job_id}", None)
+        elif status["state"] in FINISHED_STATES:
+            if status["state"] == "done":
+                st.session_state.pop(f"preview:{job_id}", None)
+            show_job(queue, job_id, status)
+        else:
+            poll_job(queue, job_id)
+
+    show_model_stats(queue.worker_stats())
+
 if __name__ == "__main__":
     main()
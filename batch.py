@@ -0,0 +1,134 @@
+"""Convert many (song, voice sample) pairs without the Streamlit form
+
+    python batch.py manifest.csv --output-dir converted/
+
+The manifest is a CSV with `song` and `sample` columns (and an optional
+`output` file name), or objects with the same keys as a .json array or
+.jsonl lines. Models load once, the next song is separated while the
+current one is converted, and every finished item is recorded in
+<output-dir>/done.jsonl so a rerun after a crash resumes where it stopped.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import audio
+import models
+from cache import ResultCache
+
+
+def load_manifest(path):
+    """Read manifest items as dicts with song, sample and output keys"""
+    path = Path(path)
+    with open(path, newline="") as f:
+        if path.suffix == ".jsonl":
+            items = [json.loads(line) for line in f if line.strip()]
+        elif path.suffix == ".json":
+            items = json.load(f)
+        else:
+            items = list(csv.DictReader(f))
+    for item in items:
+        if not item.get("output"):
+            item["output"] = f"{Path(item['song']).stem}__{Path(item['sample']).stem}.mp3"
+    return items
+
+
+def load_done(log_path):
+    if not log_path.exists():
+        return set()
+    with open(log_path) as f:
+        return {json.loads(line)["output"] for line in f if line.strip()}
+
+
+def mark_done(log_path, item, seconds):
+    with open(log_path, "a") as f:
+        f.write(json.dumps({"output": item["output"], "song": item["song"], "sample": item["sample"],
+                            "seconds": round(seconds, 2)}) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def separate_item(item, cache):
+    """Load one song and return its stems and content keys, from cache when possible"""
+    song_bytes = Path(item["song"]).read_bytes()
+    sample_bytes = Path(item["sample"]).read_bytes()
+    keys = audio.cache_keys(song_bytes, sample_bytes)
+    stems = cache.get_arrays("stems", keys["stems"])
+    if stems is None:
+        vocals, accompaniment, rate = audio.separate_vocals(audio.decode_song(song_bytes))
+        cache.put_arrays(
+            "stems", keys["stems"], pcm16=("vocals", "accompaniment"),
+            vocals=vocals, accompaniment=accompaniment, samplerate=rate
+        )
+    else:
+        vocals, accompaniment, rate = stems["vocals"], stems["accompaniment"], int(stems["samplerate"])
+    return vocals, accompaniment, rate, sample_bytes, keys
+
+
+def convert_item(item, separated, cache, output_dir):
+    """Convert and mix one separated song, writing the MP3 atomically into output_dir"""
+    vocals, accompaniment, rate, sample_bytes, keys = separated
+    converted = cache.get_arrays("vocals", keys["vocals"])
+    if converted is None:
+        speaker = audio.get_speaker_embedding(sample_bytes, cache)
+        new_vocals, new_vocals_rate = audio.generate_voice(vocals, rate, speaker)
+        cache.put_arrays("vocals", keys["vocals"], pcm16=("vocals",), vocals=new_vocals, samplerate=new_vocals_rate)
+    else:
+        new_vocals, new_vocals_rate = converted["vocals"], int(converted["samplerate"])
+
+    target = output_dir / item["output"]
+    partial = target.with_name(f".{target.name}.partial")
+    audio.mix_tracks(accompaniment, rate, new_vocals, new_vocals_rate, partial)
+    os.replace(partial, target)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("manifest", type=Path)
+    parser.add_argument("--output-dir", type=Path, default=Path("converted"))
+    parser.add_argument("--restart", action="store_true", help="ignore done.jsonl and convert every item again")
+    args = parser.parse_args()
+
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    log_path = args.output_dir / "done.jsonl"
+    if args.restart:
+        log_path.unlink(missing_ok=True)
+    done = load_done(log_path)
+    todo = [item for item in load_manifest(args.manifest)
+            if item["output"] not in done or not (args.output_dir / item["output"]).exists()]
+    print(f"{len(todo)} items to convert ({len(done)} already done)")
+
+    models.configure_cpu()
+    models.warm_up("demucs", "freevc")
+    cache = ResultCache()
+    failed = []
+
+    with ThreadPoolExecutor(max_workers=1) as separator:
+        upcoming = separator.submit(separate_item, todo[0], cache) if todo else None
+        for index, item in enumerate(todo):
+            start = time.perf_counter()
+            current = upcoming
+            upcoming = separator.submit(separate_item, todo[index + 1], cache) if index + 1 < len(todo) else None
+            try:
+                convert_item(item, current.result(), cache, args.output_dir)
+            except Exception:
+                failed.append(item)
+                print(f"[{index + 1}/{len(todo)}] FAILED {item['song']}\n{traceback.format_exc()}", file=sys.stderr)
+                continue
+            seconds = time.perf_counter() - start
+            mark_done(log_path, item, seconds)
+            print(f"[{index + 1}/{len(todo)}] {item['output']} ({seconds:.1f}s)")
+
+    if failed:
+        print(f"{len(failed)} items failed; rerun the same command to retry them", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
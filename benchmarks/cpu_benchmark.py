@@ -0,0 +1,91 @@
+"""Measure speed and quality of CPU execution settings for Demucs and FreeVC
+
+    python benchmarks/cpu_benchmark.py song.mp3 voice.mp3 --threads 1 2 4
+
+Each configuration (intra-op threads x fp32/int8) runs in a fresh process so
+torch's thread pools and quantized weights never leak between runs. Quality
+is the SNR in dB of each stage's output against the fp32 run with the same
+thread count; higher is closer, above ~30 dB is hard to hear.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _init(threads, quantize):
+    os.environ["AUDIO_TORCH_THREADS"] = str(threads)
+    os.environ["AUDIO_TORCH_INTEROP_THREADS"] = "1"
+    os.environ["AUDIO_QUANTIZE"] = "int8" if quantize else ""
+    sys.path.insert(0, str(ROOT))
+
+
+def _run(song_bytes, sample_bytes):
+    import audio
+    import models
+
+    models.configure_cpu()
+    models.warm_up("demucs", "freevc")
+    song = audio.decode_song(song_bytes)
+    speaker = audio.speaker_embedding(audio.decode_voice_sample(sample_bytes))
+
+    start = time.perf_counter()
+    vocals, _, rate = audio.separate_vocals(song)
+    separate_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    converted, _ = audio.generate_voice(vocals, rate, speaker)
+    convert_seconds = time.perf_counter() - start
+    return {
+        "separate_seconds": separate_seconds,
+        "convert_seconds": convert_seconds,
+        "rss_bytes": sum(stats["rss_bytes"] for stats in models.model_stats().values()),
+        "vocals": vocals,
+        "converted": converted,
+    }
+
+
+def snr(reference, estimate):
+    frames = min(reference.shape[-1], estimate.shape[-1])
+    reference, estimate = reference[..., :frames], estimate[..., :frames]
+    noise = np.sum((reference - estimate) ** 2)
+    return float("inf") if noise == 0 else 10 * np.log10(np.sum(reference ** 2) / noise)
+
+
+def run_config(threads, quantize, song_bytes, sample_bytes):
+    with ProcessPoolExecutor(1, mp_context=get_context("spawn"), initializer=_init,
+                             initargs=(threads, quantize)) as pool:
+        return pool.submit(_run, song_bytes, sample_bytes).result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("song", type=Path)
+    parser.add_argument("sample", type=Path)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    song_bytes, sample_bytes = args.song.read_bytes(), args.sample.read_bytes()
+    print(f"{'threads':>7} {'weights':>7} {'separate':>9} {'convert':>8} {'model MiB':>9} {'stem SNR':>9} {'voice SNR':>9}")
+    for threads in args.threads:
+        reference = run_config(threads, False, song_bytes, sample_bytes)
+        for quantize in (False, True):
+            result = reference if not quantize else run_config(threads, True, song_bytes, sample_bytes)
+            print(
+                f"{threads:>7} {'int8' if quantize else 'fp32':>7} "
+                f"{result['separate_seconds']:>8.1f}s {result['convert_seconds']:>7.1f}s "
+                f"{result['rss_bytes'] / 2**20:>9.0f} "
+                f"{snr(reference['vocals'], result['vocals']):>8.1f} "
+                f"{snr(reference['converted'], result['converted']):>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
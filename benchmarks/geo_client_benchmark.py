@@ -0,0 +1,180 @@
+"""Exercise geo_client against a local stub of weatherapi.com and OpenCage
+
+    python benchmarks/geo_client_benchmark.py --latency 0.15 --fail-first 2
+
+The stub answers with a fixed delay and can fail its first requests with
+503 to exercise retry with backoff. Reports cold, cached and
+nearby-coordinate latency, the number of upstream requests and TCP
+connections, and exits non-zero if caching, pooling or retry misbehave,
+if a stalled geocoder delays UV lookups, if reruns during a stall start
+more requests for the same place, if a read timeout is retried or not
+reported as one, or if a failed lookup's user-facing reason leaks the
+API key.
+"""
+import argparse
+import json
+import logging
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import geo_client
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency, fail_first):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.latency = latency
+        self.fail_first = fail_first
+        self.geocode_stall = 0.0
+        self.requests = 0
+        self.connections = set()
+        self.lock = threading.Lock()
+
+    def handle_error(self, request, client_address):
+        pass  # clients that timed out on purpose leave broken pipes behind
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.connections.add(self.client_address)
+            failing = server.requests <= server.fail_first
+        time.sleep(server.latency + (server.geocode_stall if self.path.startswith("/geocode") else 0))
+        if failing or self.path.startswith("/unauthorized"):
+            self.send_response(503 if failing else 401)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path.startswith("/weather"):
+            body = {"current": {"uv": 5.0}}
+        else:
+            body = {"results": [{"formatted": "1 Stub Street, Testville"}]}
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def timed(call, *args):
+    start = time.perf_counter()
+    result = call(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.1, help="stub response delay in seconds")
+    parser.add_argument("--fail-first", type=int, default=1, help="answer this many requests with 503")
+    parser.add_argument("--calls", type=int, default=20)
+    args = parser.parse_args()
+
+    server = StubServer(args.latency, args.fail_first)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = geo_client.GeoClient(
+        weather_url=f"{server.url}/weather", geocode_url=f"{server.url}/geocode",
+        session=geo_client.make_session(backoff_seconds=0.01)
+    )
+    failures = []
+
+    _, cold = timed(client.uv_index, 40.7128, -74.0060)
+    if server.requests != args.fail_first + 1:
+        failures.append(f"expected {args.fail_first} retries, stub saw {server.requests} requests")
+    upstream = server.requests
+    _, warm = timed(client.uv_index, 40.7128, -74.0060)
+    _, nearby = timed(client.uv_index, 40.7131, -74.0057)  # same rounded cell
+    if server.requests != upstream:
+        failures.append("cached coordinates reached the stub")
+
+    client.reverse_geocode(40.7128, -74.0060)
+    for i in range(args.calls):  # distinct cells: every call goes upstream over the pool
+        client.uv_index(41 + i * 0.1, -74.0)
+    pooled, pooled_connections = server.requests, len(server.connections)
+    if pooled_connections > 1:
+        failures.append(f"client opened {pooled_connections} connections for {pooled} requests")
+    bare_start = time.perf_counter()
+    for i in range(args.calls):
+        requests.get(f"{server.url}/weather", params={"q": f"{50 + i},0"}, timeout=5).json()
+    bare = (time.perf_counter() - bare_start) / args.calls
+    bare_connections = len(server.connections) - pooled_connections
+
+    # a geocoder stall that fills its pool must not delay UV lookups, cached or not
+    server.geocode_stall = 2.0
+    stalled = [client.lookup(60 + i * 0.01, 10.0) for i in range(geo_client.LOOKUP_WORKERS * 2)]
+    for lookups in stalled:
+        lookups["uv"].result()
+    lookups, cached_during_stall = timed(client.lookup, 40.7128, -74.0060)
+    _, fresh_during_stall = timed(lambda: client.lookup(-33.9, 18.4)["uv"].result(timeout=5))
+    if not lookups["uv"].done():
+        failures.append("cached UV index waited behind a stalled geocoder")
+    if fresh_during_stall > args.latency + 1.0:
+        failures.append(f"UV lookup took {fresh_during_stall:.2f}s while the geocoder stalled")
+    if client.lookup(60.0, 10.0)["location"] is not stalled[0]["location"]:
+        failures.append("a rerun during the stall started a second request for the same place")
+
+    impatient = geo_client.GeoClient(
+        weather_url=f"{server.url}/weather", geocode_url=f"{server.url}/geocode",
+        timeout=(1.0, args.latency + 0.3), session=geo_client.make_session(backoff_seconds=0.01)
+    )
+    logging.getLogger("geo_client").setLevel(logging.ERROR)  # the expected failures would print their tracebacks
+    ((_, _, timeout_error),), timed_out = timed(
+        lambda: list(geo_client.completed({"location": impatient.lookup(70.0, 10.0)["location"]}))
+    )
+    timeout_reason = geo_client.failure_reason(timeout_error)
+    if timeout_reason != "timed out":
+        failures.append(f"read timeout shown to users as {timeout_reason!r}")
+    if timed_out > 2 * (args.latency + 0.3):
+        failures.append(f"read timeout was retried, the lookup took {timed_out:.2f}s")
+    server.geocode_stall = 0.0
+
+    secret = "SECRET123"
+    leaky = geo_client.GeoClient(
+        weather_url=f"{server.url}/unauthorized", weather_key=secret, geocode_url=f"{server.url}/unauthorized",
+        session=geo_client.make_session(retries=0)
+    )
+    (_, _, error), = geo_client.completed({"uv": leaky.lookup(1.0, 2.0)["uv"]})
+    reason = geo_client.failure_reason(error)
+    if error is None or secret in reason or "401" not in reason:
+        failures.append(f"failed lookup reason leaks the key or is missing: {reason!r}")
+
+    print(f"cold (with {args.fail_first} retries)  {cold * 1000:8.1f} ms")
+    print(f"cached                   {warm * 1000:8.3f} ms")
+    print(f"nearby, same cell        {nearby * 1000:8.3f} ms")
+    print(f"bare requests.get        {bare * 1000:8.1f} ms per call")
+    print(f"client                   {pooled} upstream requests over {pooled_connections} connection(s)")
+    print(f"bare requests.get        {args.calls} requests over {bare_connections} connections")
+    print(f"cached UV, geocoder stall {cached_during_stall * 1000:7.3f} ms")
+    print(f"fresh UV, geocoder stall {fresh_during_stall * 1000:8.1f} ms")
+    print(f"read timeout shown as    {timeout_reason!r} after {timed_out * 1000:.0f} ms")
+    print(f"401 shown to users as    {reason!r}")
+    print(f"cache                    {client.stats()}")
+    server.shutdown()
+
+    for line in failures:
+        print(f"FAIL {line}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Compare audio.mix_tracks against the old pydub AudioSegment.overlay path
+
+    python benchmarks/mix_benchmark.py --seconds 30 180 600
+"""
+import argparse
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+from pydub import AudioSegment
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import audio
+
+SONG_RATE = 44100
+VOCALS_RATE = 24000
+
+
+def to_segment(samples, samplerate):
+    """Wrap float samples shaped (channels, frames) as a 16-bit AudioSegment"""
+    samples = np.atleast_2d(samples)
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16).T.tobytes()
+    return AudioSegment(data=pcm, sample_width=2, frame_rate=samplerate, channels=samples.shape[0])
+
+
+def overlay_mix(instrumental, instrumental_rate, vocals, vocals_rate, final_output_path):
+    """The pydub mixing path mix_tracks replaced"""
+    mixed = to_segment(instrumental, instrumental_rate).overlay(to_segment(vocals, vocals_rate))
+    mixed.export(final_output_path, format="mp3")
+
+
+def synthetic_tracks(seconds, seed=0):
+    rng = np.random.default_rng(seed)
+    instrumental = rng.uniform(-0.5, 0.5, (2, int(seconds * SONG_RATE))).astype(np.float32)
+    vocals = rng.uniform(-0.5, 0.5, int(seconds * VOCALS_RATE)).astype(np.float32)
+    return instrumental, vocals
+
+
+def measure(mix, seconds, output):
+    instrumental, vocals = synthetic_tracks(seconds)
+    tracemalloc.start()
+    start = time.perf_counter()
+    mix(instrumental, SONG_RATE, vocals, VOCALS_RATE, output)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, nargs="+", default=[30, 180])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'duration':>9} {'path':>8} {'best time':>10} {'peak MiB':>9}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        output = Path(tmpdir) / "mix.mp3"
+        for seconds in args.seconds:
+            for name, mix in (("overlay", overlay_mix), ("numpy", audio.mix_tracks)):
+                runs = [measure(mix, seconds, output) for _ in range(args.repeat)]
+                best = min(elapsed for elapsed, _ in runs)
+                peak = max(peak for _, peak in runs)
+                print(f"{seconds:>8.0f}s {name:>8} {best:>9.2f}s {peak / 2**20:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""Headless benchmark of the audio.py pipeline stages
+
+    python benchmarks/pipeline_benchmark.py --stub-models --output run.json
+    python benchmarks/pipeline_benchmark.py --stub-models --compare run.json
+
+Runs decode_song, decode_voice_sample, speaker_embedding, separate_vocals,
+generate_voice and mix_tracks on synthetic songs of each duration and
+reports latency percentiles, real-time factor and peak RSS per stage.
+--stub-models swaps Demucs and FreeVC for cheap stand-ins with the same
+interface, so the suite runs offline on a CPU-only box in well under a minute.
+"""
+import argparse
+import json
+import logging
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import audio
+import models
+import profiling
+import streaming
+
+SONG_RATE = 44100
+VOICE_SECONDS = 20
+STAGES = (
+    "decode_song", "decode_voice_sample", "speaker_embedding",
+    "separate_vocals", "generate_voice", "mix_tracks"
+)
+# these only see the voice sample, so their real-time factor is against its length
+VOICE_STAGES = ("decode_voice_sample", "speaker_embedding")
+
+
+def register_stub_models():
+    """Replace the real model loaders with stand-ins that need no weights or network"""
+    import torch
+
+    class StubDemucs(torch.nn.Module):
+        samplerate = SONG_RATE
+        audio_channels = 2
+        sources = ["drums", "bass", "other", "vocals"]
+        segment = 7.8
+
+        def forward(self, mix):
+            return mix[:, None].expand(-1, len(self.sources), -1, -1) / len(self.sources)
+
+    class StubFreeVC:
+        config = SimpleNamespace(
+            audio=SimpleNamespace(input_sample_rate=16000),
+            model_args=SimpleNamespace(use_spk=True)
+        )
+        device = "cpu"
+        enc_spk_ex = SimpleNamespace(embed_utterance=lambda wav: np.full(256, np.abs(wav).mean(), dtype=np.float32))
+
+        def extract_wavlm_features(self, y):
+            return y[:, None, ::320]
+
+        def inference(self, c, g=None):
+            return torch.repeat_interleave(c, 480, dim=-1)[:, None] * g.mean()
+
+    voice_converter = SimpleNamespace(vc_model=StubFreeVC(), output_sample_rate=24000)
+    models.evict()
+    models.register("demucs", lambda: StubDemucs().eval())
+    models.register("freevc", lambda: SimpleNamespace(voice_converter=voice_converter))
+
+
+def synthetic_mp3(seconds, path, seed=0):
+    """Encode a tone-plus-noise stereo song of the given length and return its bytes"""
+    rng = np.random.default_rng(seed)
+    with streaming.Mp3Encoder(path, SONG_RATE, 2) as encoder:
+        block = SONG_RATE * 10
+        for start in range(0, int(seconds * SONG_RATE), block):
+            t = (np.arange(start, min(start + block, int(seconds * SONG_RATE))) / SONG_RATE).astype(np.float32)
+            tone = 0.3 * np.sin(2 * np.pi * 220 * t)
+            encoder.write(np.stack([tone, tone]) + rng.normal(0, 0.05, (2, len(t))).astype(np.float32))
+    return Path(path).read_bytes()
+
+
+def run_once(song_bytes, sample_bytes, output):
+    with profiling.Profiler() as profiler:
+        song = audio.decode_song(song_bytes)
+        speaker = audio.speaker_embedding(audio.decode_voice_sample(sample_bytes))
+        vocals, accompaniment, rate = audio.separate_vocals(song)
+        del song
+        new_vocals, new_vocals_rate = audio.generate_voice(vocals, rate, speaker)
+        audio.mix_tracks(accompaniment, rate, new_vocals, new_vocals_rate, output)
+    return profiler.records
+
+
+def summarize(runs, seconds):
+    voice_seconds = min(VOICE_SECONDS, audio.VOICE_SAMPLE_SECONDS)
+    summary = {}
+    for stage in STAGES:
+        walls = [r["wall_seconds"] for records in runs for r in records if r["stage"] == stage]
+        cpus = [r["cpu_seconds"] for records in runs for r in records if r["stage"] == stage]
+        peaks = [r["peak_rss_bytes"] for records in runs for r in records if r["stage"] == stage]
+        if not walls:
+            continue
+        p50, p90, p99 = np.percentile(walls, [50, 90, 99])
+        summary[stage] = {
+            "p50_seconds": float(p50),
+            "p90_seconds": float(p90),
+            "p99_seconds": float(p99),
+            "cpu_seconds": float(np.median(cpus)),
+            "real_time_factor": float(p50 / (voice_seconds if stage in VOICE_STAGES else seconds)),
+            "peak_rss_bytes": int(max(peaks)),
+        }
+    return summary
+
+
+def compare(results, baseline, tolerance):
+    """Return a line for every stage whose median latency grew by more than `tolerance`"""
+    regressions = []
+    for duration, stages in results["durations"].items():
+        for stage, current in stages.items():
+            previous = baseline.get("durations", {}).get(duration, {}).get(stage)
+            if previous and current["p50_seconds"] > previous["p50_seconds"] * (1 + tolerance):
+                regressions.append(
+                    f"{stage} @ {duration}s: p50 {previous['p50_seconds']:.3f}s -> {current['p50_seconds']:.3f}s"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, nargs="+", default=[30, 180, 600])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--stub-models", action="store_true", help="use stand-ins instead of Demucs and FreeVC")
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    parser.add_argument("--compare", type=Path, help="baseline JSON from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 slowdown before failing")
+    args = parser.parse_args()
+
+    logging.getLogger("audio.profile").setLevel(logging.WARNING)  # summarized below instead
+    if args.stub_models:
+        register_stub_models()
+    models.warm_up("demucs", "freevc")
+
+    results = {
+        "created": time.time(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "stub_models": args.stub_models,
+        "model_load": models.model_stats(),
+        "durations": {},
+    }
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        sample_bytes = synthetic_mp3(VOICE_SECONDS, tmp_path / "sample.mp3", seed=1)
+        for seconds in args.seconds:
+            song_bytes = synthetic_mp3(seconds, tmp_path / "song.mp3")
+            runs = [run_once(song_bytes, sample_bytes, tmp_path / "out.mp3") for _ in range(args.repeat)]
+            summary = summarize(runs, seconds)
+            results["durations"][str(int(seconds))] = summary
+
+            print(f"\n{seconds:.0f}s song")
+            print(f"{'stage':>20} {'p50':>8} {'p90':>8} {'p99':>8} {'RTF':>7} {'peak MiB':>9}")
+            for stage, row in summary.items():
+                print(
+                    f"{stage:>20} {row['p50_seconds']:>7.2f}s {row['p90_seconds']:>7.2f}s "
+                    f"{row['p99_seconds']:>7.2f}s {row['real_time_factor']:>7.3f} "
+                    f"{row['peak_rss_bytes'] / 2**20:>9.0f}"
+                )
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+    if args.compare:
+        regressions = compare(results, json.loads(args.compare.read_text()), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
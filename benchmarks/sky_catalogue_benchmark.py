@@ -0,0 +1,121 @@
+"""Check sky_catalogue.build() and payload() on a synthetic sky, without the catalogue packages
+
+    python benchmarks/sky_catalogue_benchmark.py --stars 20000 --deep-sky 500
+
+Random stars and named deep-sky objects go through build() and payload()
+the way get_sky_catalogue() uses them. Fails if the grid index is
+inconsistent (objects outside their cell, wrong cell order, bad
+cell_start), the base64 buffers do not decode to the built arrays, or a
+catalogue that fails to load takes the build down instead of leaving
+the layer empty.
+"""
+import argparse
+import base64
+import logging
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import sky_catalogue
+
+
+def synthetic_sky(stars, deep_sky, seed=0):
+    """Uniformly distributed (ra, dec, magnitude) stars and deep-sky objects with names"""
+    rng = np.random.default_rng(seed)
+
+    def points(count):
+        return rng.uniform(0, 2 * np.pi, count), np.arcsin(rng.uniform(-1, 1, count)), rng.uniform(-1.5, 6.5, count)
+
+    return points(stars), points(deep_sky) + ([f"NGC {i}" for i in range(deep_sky)],)
+
+
+def decoded(text, dtype):
+    return np.frombuffer(base64.b64decode(text), dtype=np.dtype(dtype).newbyteorder("<"))
+
+
+def check(catalogue, payload, cell_degrees):
+    """Lines describing every way the built index or its payload is wrong"""
+    failures = []
+    count = len(catalogue["magnitudes"])
+    start = catalogue["cell_start"]
+    if start[0] != 0 or start[-1] != count or np.any(np.diff(start.astype(np.int64)) < 0):
+        failures.append("cell_start does not partition the objects")
+
+    cells = np.repeat(np.arange(len(start) - 1), np.diff(start.astype(np.int64)))
+    vectors = catalogue["vectors"].astype(np.float64)
+    if not np.allclose(np.linalg.norm(vectors, axis=1), 1, atol=1e-5):
+        failures.append("vectors are not unit length")
+    edges, per_band, offsets = sky_catalogue.grid_cells(cell_degrees)
+    ra = np.arctan2(vectors[:, 1], vectors[:, 0])
+    dec = np.arcsin(np.clip(vectors[:, 2], -1, 1))
+    # objects on a cell edge may land in the neighbour after the float32 round trip
+    cos = np.einsum("ij,ij->i", vectors, catalogue["cell_centers"][cells].astype(np.float64))
+    outside = np.arccos(np.clip(cos, -1, 1)) > catalogue["cell_radii"][cells] + 1e-4
+    if outside.any():
+        failures.append(f"{outside.sum()} objects lie outside their cell's bounding radius")
+    wrong = sky_catalogue.cell_of(ra, dec, edges, per_band, offsets) != cells
+    if wrong.sum() > count * 1e-3:
+        failures.append(f"{wrong.sum()} objects are filed under the wrong cell")
+    magnitudes = catalogue["magnitudes"]
+    if any(np.any(np.diff(magnitudes[a:b]) < 0) for a, b in zip(start[:-1], start[1:])):
+        failures.append("objects are not brightest-first within their cell")
+    if any(catalogue["kinds"][index] != sky_catalogue.DEEP_SKY for index, _ in catalogue["labels"]):
+        failures.append("a label points at a star")
+
+    for key, name, dtype in (
+        ("vectors", "vectors", np.float32), ("magnitudes", "magnitudes", np.float32),
+        ("kinds", "kinds", np.uint8), ("cell_start", "cellStart", np.uint32),
+        ("cell_centers", "cellCenters", np.float32), ("cell_radii", "cellRadii", np.float32),
+    ):
+        if not np.array_equal(decoded(payload[name], dtype), np.ravel(catalogue[key])):
+            failures.append(f"payload {name} does not decode to the built array")
+    if payload["count"] != count or payload["cells"] != len(start) - 1:
+        failures.append("payload count or cells is wrong")
+    return failures
+
+
+def failing_loader(max_magnitude):
+    raise ImportError("catalogue package not installed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stars", type=int, default=20000)
+    parser.add_argument("--deep-sky", type=int, default=500)
+    parser.add_argument("--cell-degrees", type=float, default=sky_catalogue.INDEX_CELL_DEGREES)
+    args = parser.parse_args()
+
+    stars, deep_sky = synthetic_sky(args.stars, args.deep_sky)
+    start = time.perf_counter()
+    catalogue = sky_catalogue.build(cell_degrees=args.cell_degrees, stars=stars, deep_sky=deep_sky)
+    built = time.perf_counter() - start
+    payload = sky_catalogue.payload(catalogue)
+    encoded = time.perf_counter() - start - built
+    failures = check(catalogue, payload, args.cell_degrees)
+
+    # missing packages must leave an empty, still valid layer
+    logging.disable(logging.WARNING)
+    sky_catalogue.load_stars = sky_catalogue.load_deep_sky = failing_loader
+    try:
+        empty = sky_catalogue.build(cell_degrees=args.cell_degrees)
+    except Exception as e:
+        failures.append(f"build() raised {e!r} when the catalogues could not load")
+    else:
+        if len(empty["magnitudes"]):
+            failures.append("failed catalogues still produced objects")
+        failures += [f"empty catalogue: {line}" for line in check(empty, sky_catalogue.payload(empty), args.cell_degrees)]
+
+    print(f"{len(catalogue['magnitudes'])} objects in {payload['cells']} cells, {len(catalogue['labels'])} labels")
+    print(f"build   {built * 1000:8.1f} ms")
+    print(f"payload {encoded * 1000:8.1f} ms")
+    for line in failures:
+        print(f"FAIL {line}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Cold-start import cost of each Streamlit entry point, measured with -X importtime
+
+    python benchmarks/startup_benchmark.py --output startup.json
+    python benchmarks/startup_benchmark.py --compare startup.json
+
+For main.py, ar_planets.py, location.py and audio.py, the module-level
+imports are replayed in a fresh interpreter under `python -X importtime`,
+so the number is what every new server process pays before the first
+widget renders. Fails when an entry point imports a module that must load
+lazily, exceeds --budget-ms, or is slower than the --compare baseline by
+more than --tolerance.
+"""
+import argparse
+import ast
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+ENTRY_POINTS = ("main.py", "ar_planets.py", "location.py", "audio.py")
+
+# Loaded on first use only; importing them at startup is a regression
+DEFERRED = {
+    "main.py": ("hipparcos_catalog", "pyongc", "requests"),
+    "ar_planets.py": ("hipparcos_catalog", "pyongc", "requests"),
+    "location.py": ("matplotlib", "pandas", "opencage", "requests"),
+    "audio.py": ("torch", "TTS", "demucs", "pydub", "matplotlib"),
+}
+
+
+def startup_imports(path):
+    """Source of the top-level import statements of an entry point"""
+    tree = ast.parse(path.read_text())
+    return "\n".join(
+        ast.get_source_segment(path.read_text(), node)
+        for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))
+    )
+
+
+def import_profile(source):
+    """Wall time, per-module cumulative microseconds and loaded modules for one cold import"""
+    probe = source + "\nimport sys, json\nprint(json.dumps(sorted(sys.modules)))"
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    wall = time.perf_counter() - start
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, usecs, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "):  # top-level imports only; nested ones are already in these totals
+            cumulative[name.strip()] = int(usecs)
+    return wall, cumulative, json.loads(result.stdout.splitlines()[-1])
+
+
+def measure(entry, repeat, interpreter_modules):
+    source = startup_imports(ROOT / entry)
+    runs = [import_profile(source) for _ in range(repeat)]
+    for _, cumulative, _ in runs:
+        for name in interpreter_modules:  # site, encodings, ...: paid by any python process
+            cumulative.pop(name, None)
+    totals = [sum(cumulative.values()) / 1000 for _, cumulative, _ in runs]
+    best = min(range(repeat), key=lambda i: totals[i])
+    _, cumulative, modules = runs[best]
+    top = sorted(cumulative.items(), key=lambda item: -item[1])[:5]
+    return {
+        "import_ms": statistics.median(totals),
+        "process_ms": statistics.median(wall * 1000 for wall, _, _ in runs),
+        "top_imports": {name: usecs / 1000 for name, usecs in top},
+        "eager_heavy": sorted(
+            name for name in DEFERRED.get(entry, ())
+            if any(module == name or module.startswith(f"{name}.") for module in modules)
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entry", nargs="+", default=list(ENTRY_POINTS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, help="fail any entry point whose median import time exceeds this")
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    parser.add_argument("--compare", type=Path, help="baseline JSON from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown against the baseline")
+    args = parser.parse_args()
+
+    results = {"created": time.time(), "python": platform.python_version(), "entry_points": {}}
+    baseline = json.loads(args.compare.read_text())["entry_points"] if args.compare else {}
+    failures = []
+    interpreter_modules = set(import_profile("")[1])
+    print(f"{'entry point':>14} {'imports':>9} {'process':>9}  slowest imports")
+    for entry in args.entry:
+        try:
+            row = measure(entry, args.repeat, interpreter_modules)
+        except subprocess.CalledProcessError as e:
+            failures.append(f"{entry}: imports failed\n{e.stderr.strip().splitlines()[-1]}")
+            continue
+        results["entry_points"][entry] = row
+        top = ", ".join(f"{name} {ms:.0f}" for name, ms in row["top_imports"].items())
+        print(f"{entry:>14} {row['import_ms']:>7.0f}ms {row['process_ms']:>7.0f}ms  {top}")
+
+        if row["eager_heavy"]:
+            failures.append(f"{entry}: imports {', '.join(row['eager_heavy'])} at startup")
+        if args.budget_ms and row["import_ms"] > args.budget_ms:
+            failures.append(f"{entry}: {row['import_ms']:.0f}ms over the {args.budget_ms:.0f}ms budget")
+        previous = baseline.get(entry)
+        if previous and row["import_ms"] > previous["import_ms"] * (1 + args.tolerance):
+            failures.append(f"{entry}: {previous['import_ms']:.0f}ms -> {row['import_ms']:.0f}ms")
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+    for line in failures:
+        print(f"REGRESSION {line}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
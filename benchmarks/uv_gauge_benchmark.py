@@ -0,0 +1,87 @@
+"""Render time and memory growth of the UV gauge, against the old matplotlib figure
+
+    python benchmarks/uv_gauge_benchmark.py --renders 500
+    python benchmarks/uv_gauge_benchmark.py --renders 200 --legacy
+
+Renders the gauge for a sweep of UV values the way location.py does on each
+rerun and tracks traced memory after a warm-up. Fails if the gauge pulls in
+matplotlib or keeps growing past --max-growth-kib. --legacy also runs the
+previous plt.subplots/imshow/savefig path (never closed, as st.pyplot was
+called) to show the leak it replaced.
+"""
+import argparse
+import io
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import uv_gauge
+
+
+def legacy_render(uv_index):
+    """The figure display_uv_index used to build on every rerun"""
+    import matplotlib
+    matplotlib.use("Agg")
+    matplotlib.rcParams["figure.max_open_warning"] = 0  # the leak is what is being measured
+    import matplotlib.pyplot as plt
+    import numpy as np
+
+    fig, ax = plt.subplots(figsize=(6, 1))
+    gradient = np.vstack([np.linspace(1, 0, 256)] * 2)
+    ax.imshow(gradient, aspect='auto', cmap=plt.get_cmap('RdYlGn'))
+    ax.set_axis_off()
+    color = uv_gauge.uv_color(uv_index)
+    ax.annotate('▼', xy=(uv_index / 11.0, -0.1), xycoords='axes fraction', color=color, fontsize=20, ha='center')
+    ax.text(0.5, -0.5, f'UV Index: {uv_index}', color=color, fontsize=15, ha='center', va='center',
+            transform=ax.transAxes)
+    fig.patch.set_alpha(0.0)
+    ax.patch.set_alpha(0.0)
+    fig.savefig(io.BytesIO(), format="png")  # what st.pyplot does with the figure
+    return len(plt.get_fignums())
+
+
+def measure(render, renders, warmup):
+    values = [round(i * 0.1, 1) for i in range(121)]
+    for i in range(warmup):
+        render(values[i % len(values)])
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    for i in range(renders):
+        result = render(values[i % len(values)])
+    seconds = (time.perf_counter() - start) / renders
+    growth = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return seconds, growth, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--renders", type=int, default=500)
+    parser.add_argument("--max-growth-kib", type=float, default=64)
+    parser.add_argument("--legacy", action="store_true", help="also measure the matplotlib figure")
+    args = parser.parse_args()
+
+    # warm up over every cached value, so growth afterwards would be a leak
+    seconds, growth, _ = measure(uv_gauge.gauge_html, args.renders, warmup=121)
+    print(f"{'gauge':>8} {seconds * 1e6:10.1f} us/render {growth / 1024:10.1f} KiB growth")
+    failures = []
+    if "matplotlib" in sys.modules:
+        failures.append("uv_gauge imported matplotlib")
+    if growth > args.max_growth_kib * 1024:
+        failures.append(f"gauge memory grew {growth / 1024:.1f} KiB over {args.renders} renders")
+
+    if args.legacy:
+        seconds, growth, figures = measure(legacy_render, args.renders, warmup=3)
+        print(f"{'legacy':>8} {seconds * 1e6:10.1f} us/render {growth / 1024:10.1f} KiB growth, {figures} open figures")
+
+    for line in failures:
+        print(f"FAIL {line}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import contextlib
+import hashlib
+import io
+import os
+import threading
+from pathlib import Path
+import numpy as np
+
+CACHE_DIR = Path(os.environ.get("AUDIO_CACHE_DIR", Path.home() / ".cache" / "seltest-audio"))
+CACHE_MAX_BYTES = int(os.environ.get("AUDIO_CACHE_MAX_BYTES", 5 * 2**30))
+SCALE_SUFFIX = "__pcm16_scale"
+
+
+def content_hash(*parts):
+    """SHA-256 over bytes/str parts, length-prefixed so different splits never collide"""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode()
+        digest.update(len(part).to_bytes(8, "little"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """On-disk cache of pipeline results, one directory per layer, evicted least-recently-used first"""
+
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _path(self, layer, key, suffix):
+        return self.root / layer / f"{key}{suffix}"
+
+    def _read(self, path):
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        with contextlib.suppress(FileNotFoundError):  # evicted since the read; the data is still good
+            os.utime(path)
+        self.hits += 1
+        return data
+
+    def _write(self, path, data):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        self.evict()
+
+    def get_bytes(self, layer, key):
+        return self._read(self._path(layer, key, ".bin"))
+
+    def put_bytes(self, layer, key, data):
+        self._write(self._path(layer, key, ".bin"), data)
+
+    def get_arrays(self, layer, key):
+        """Return the arrays stored under `key` as a dict, or None on a miss"""
+        data = self._read(self._path(layer, key, ".npz"))
+        if data is None:
+            return None
+        with np.load(io.BytesIO(data)) as stored:
+            arrays = {name: stored[name] for name in stored.files}
+        for name in [name for name in arrays if name.endswith(SCALE_SUFFIX)]:
+            scale = arrays.pop(name)
+            audio = name[:-len(SCALE_SUFFIX)]
+            arrays[audio] = arrays[audio].astype(np.float32) * scale
+        return arrays
+
+    def put_arrays(self, layer, key, pcm16=(), **arrays):
+        """Store arrays under `key`; float audio named in pcm16 is kept as int16 scaled to its peak, half the size"""
+        for name in pcm16:
+            samples = np.asarray(arrays[name], dtype=np.float32)
+            peak = float(np.abs(samples).max(initial=0.0)) or 1.0
+            arrays[name] = np.round(samples * (32767 / peak)).astype(np.int16)
+            arrays[name + SCALE_SUFFIX] = np.float32(peak / 32767)
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        self._write(self._path(layer, key, ".npz"), buffer.getvalue())
+
+    def size(self):
+        return sum(path.stat().st_size for path in self.root.glob("*/*") if path.is_file())
+
+    def evict(self):
+        """Delete the least recently used entries until the cache fits in max_bytes"""
+        with self._lock:
+            entries = []
+            for path in self.root.glob("*/*"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                if not path.name.startswith("."):
+                    entries.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
@@ -0,0 +1,130 @@
+import time
+import numpy as np
+
+# Keplerian elements and their rates per Julian century (J2000 ecliptic), valid 1800-2050:
+# a (au), e, I, L, long. perihelion, long. ascending node (degrees)
+# from Standish, "Keplerian Elements for Approximate Positions of the Major Planets", JPL
+ELEMENTS = {
+    "Mercury": ((0.38709927, 0.20563593, 7.00497902, 252.25032350, 77.45779628, 48.33076593),
+                (0.00000037, 0.00001906, -0.00594749, 149472.67411175, 0.16047689, -0.12534081)),
+    "Venus": ((0.72333566, 0.00677672, 3.39467605, 181.97909950, 131.60246718, 76.67984255),
+              (0.00000390, -0.00004107, -0.00078890, 58517.81538729, 0.00268329, -0.27769418)),
+    "Earth": ((1.00000261, 0.01671123, -0.00001531, 100.46457166, 102.93768193, 0.0),
+              (0.00000562, -0.00004392, -0.01294668, 35999.37244981, 0.32327364, 0.0)),
+    "Mars": ((1.52371034, 0.09339410, 1.84969142, -4.55343205, -23.94362959, 49.55953891),
+             (0.00001847, 0.00007882, -0.00813131, 19140.30268499, 0.44441088, -0.29257343)),
+    "Jupiter": ((5.20288700, 0.04838624, 1.30439695, 34.39644051, 14.72847983, 100.47390909),
+                (-0.00011607, -0.00013253, -0.00183714, 3034.74612775, 0.21252668, 0.20469106)),
+    "Saturn": ((9.53667594, 0.05386179, 2.48599187, 49.95424423, 92.59887831, 113.66242448),
+               (-0.00125060, -0.00050991, 0.00193609, 1222.49362201, -0.41897216, -0.28867794)),
+    "Uranus": ((19.18916464, 0.04725744, 0.77263783, 313.23810451, 170.95427630, 74.01692503),
+               (-0.00196176, -0.00004397, -0.00242939, 428.48202785, 0.40805281, 0.04240589)),
+    "Neptune": ((30.06992276, 0.00859048, 1.77004347, -55.12002969, 44.96476227, 131.78422574),
+                (0.00026291, 0.00005105, 0.00035372, 218.45945325, -0.32241464, -0.00508664)),
+}
+
+PLANETS = [name for name in ELEMENTS if name != "Earth"]
+
+# Volumetric mean radius in km, as served by api.le-systeme-solaire.net
+MEAN_RADIUS_KM = {
+    "Mercury": 2439.4,
+    "Venus": 6051.8,
+    "Mars": 3389.5,
+    "Jupiter": 69911.0,
+    "Saturn": 58232.0,
+    "Uranus": 25362.0,
+    "Neptune": 24622.0,
+}
+OBLIQUITY = np.radians(23.43928)
+
+_BASE = np.array([ELEMENTS[name][0] for name in ELEMENTS])
+_RATES = np.array([ELEMENTS[name][1] for name in ELEMENTS])
+_EARTH = list(ELEMENTS).index("Earth")
+_PLANET_ROWS = [i for i, name in enumerate(ELEMENTS) if name != "Earth"]
+
+
+def julian_date(timestamp=None):
+    """Julian date of a Unix timestamp (now by default)"""
+    if timestamp is None:
+        timestamp = time.time()
+    return np.asarray(timestamp, dtype=float) / 86400.0 + 2440587.5
+
+
+def heliocentric(jd):
+    """Heliocentric J2000 equatorial positions in au, shaped (bodies, 3, *jd.shape)"""
+    jd = np.asarray(jd, dtype=float)
+    t = (jd - 2451545.0) / 36525.0
+    elements = _BASE.reshape(_BASE.shape + (1,) * t.ndim) + _RATES.reshape(_RATES.shape + (1,) * t.ndim) * t
+    a, e, incl, mean_long, peri, node = (elements[:, k] for k in range(6))
+    incl, node = np.radians(incl), np.radians(node)
+    arg_peri = np.radians(peri) - node
+    mean_anomaly = np.radians((mean_long - peri + 180.0) % 360.0 - 180.0)
+
+    eccentric = mean_anomaly + e * np.sin(mean_anomaly)
+    for _ in range(6):
+        eccentric -= (eccentric - e * np.sin(eccentric) - mean_anomaly) / (1 - e * np.cos(eccentric))
+
+    x_orb = a * (np.cos(eccentric) - e)
+    y_orb = a * np.sqrt(1 - e * e) * np.sin(eccentric)
+    cos_w, sin_w = np.cos(arg_peri), np.sin(arg_peri)
+    cos_n, sin_n = np.cos(node), np.sin(node)
+    cos_i, sin_i = np.cos(incl), np.sin(incl)
+
+    x = (cos_w * cos_n - sin_w * sin_n * cos_i) * x_orb + (-sin_w * cos_n - cos_w * sin_n * cos_i) * y_orb
+    y = (cos_w * sin_n + sin_w * cos_n * cos_i) * x_orb + (-sin_w * sin_n + cos_w * cos_n * cos_i) * y_orb
+    z = (sin_w * sin_i) * x_orb + (cos_w * sin_i) * y_orb
+
+    cos_e, sin_e = np.cos(OBLIQUITY), np.sin(OBLIQUITY)
+    return np.stack([x, cos_e * y - sin_e * z, sin_e * y + cos_e * z], axis=1)
+
+
+def right_ascension_declination(jd):
+    """Geocentric RA and declination in radians, shaped (planets, *jd.shape)"""
+    positions = heliocentric(jd)
+    geocentric = positions[_PLANET_ROWS] - positions[_EARTH]
+    x, y, z = geocentric[:, 0], geocentric[:, 1], geocentric[:, 2]
+    return np.arctan2(y, x), np.arctan2(z, np.hypot(x, y))
+
+
+def sidereal_angle(jd):
+    """Greenwich mean sidereal time in radians"""
+    days = np.asarray(jd, dtype=float) - 2451545.0
+    return np.radians((280.46061837 + 360.98564736629 * days) % 360.0)
+
+
+def horizontal(latitude, longitude, timestamp=None):
+    """Azimuth (from north, eastwards) and altitude in degrees, shaped (planets, *observers)"""
+    latitude, longitude, jd = np.broadcast_arrays(
+        np.radians(latitude), np.radians(longitude), julian_date(timestamp)
+    )
+    ra, dec = right_ascension_declination(jd)
+
+    hour_angle = sidereal_angle(jd) + longitude - ra
+
+    sin_alt = np.sin(latitude) * np.sin(dec) + np.cos(latitude) * np.cos(dec) * np.cos(hour_angle)
+    altitude = np.arcsin(np.clip(sin_alt, -1.0, 1.0))
+    azimuth = np.arctan2(
+        -np.sin(hour_angle) * np.cos(dec),
+        np.cos(latitude) * np.sin(dec) - np.sin(latitude) * np.cos(dec) * np.cos(hour_angle)
+    )
+    return np.degrees(azimuth) % 360.0, np.degrees(altitude)
+
+
+def records(azimuth, altitude, above_horizon=True):
+    """Planet dicts shaped like the visibleplanets.dev response, from per-planet az/alt arrays"""
+    return [
+        {
+            "name": name,
+            "azimuth": round(float(az), 3),
+            "altitude": round(float(alt), 3),
+            "meanradius": MEAN_RADIUS_KM[name],
+        }
+        for name, az, alt in zip(PLANETS, azimuth, altitude)
+        if alt > 0 or not above_horizon
+    ]
+
+
+def planet_positions(latitude, longitude, timestamp=None, above_horizon=True):
+    """Planets for one observer, by default only those above the horizon"""
+    azimuth, altitude = horizontal(latitude, longitude, timestamp)
+    return records(azimuth, altitude, above_horizon)
@@ -0,0 +1,248 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError, as_completed
+import streamlit as st
+
+WEATHER_URL = os.environ.get("WEATHER_API_URL", "http://api.weatherapi.com/v1/current.json")
+WEATHER_KEY = os.environ.get("WEATHER_API_KEY", "f3fec67a02fe41d58e8114039242710")
+GEOCODE_URL = os.environ.get("OPENCAGE_API_URL", "https://api.opencagedata.com/geocode/v1/json")
+GEOCODE_KEY = os.environ.get("OPENCAGE_API_KEY", "9221b753d53f431d96d09fadc23fe420")
+
+CONNECT_TIMEOUT = float(os.environ.get("GEO_CONNECT_TIMEOUT", 3.05))
+READ_TIMEOUT = float(os.environ.get("GEO_READ_TIMEOUT", 5))
+RETRIES = int(os.environ.get("GEO_RETRIES", 3))
+CONNECT_RETRIES = int(os.environ.get("GEO_CONNECT_RETRIES", 1))
+BACKOFF_SECONDS = float(os.environ.get("GEO_BACKOFF_SECONDS", 0.3))
+LOOKUP_TIMEOUT = float(os.environ.get("GEO_LOOKUP_TIMEOUT", 8))
+# a stalled upstream holds a worker for at most CONNECT_TIMEOUT + READ_TIMEOUT (a timed-out read is not
+# retried) and only one per rounded coordinate, so 16 workers absorb a new place every half second
+LOOKUP_WORKERS = int(os.environ.get("GEO_LOOKUP_WORKERS", 16))  # per upstream
+POOL_SIZE = int(os.environ.get("GEO_POOL_SIZE", LOOKUP_WORKERS))
+
+# UV moves slowly over ~1 km and ~10 minutes; a place's address essentially never changes
+UV_DECIMALS = int(os.environ.get("GEO_UV_DECIMALS", 2))
+UV_TTL_SECONDS = float(os.environ.get("GEO_UV_TTL_SECONDS", 600))
+GEOCODE_DECIMALS = int(os.environ.get("GEO_GEOCODE_DECIMALS", 3))
+GEOCODE_TTL_SECONDS = float(os.environ.get("GEO_GEOCODE_TTL_SECONDS", 30 * 86400))
+MAX_ENTRIES = int(os.environ.get("GEO_CACHE_ENTRIES", 10000))
+LOCATION_REFRESH_SECONDS = float(os.environ.get("GEO_LOCATION_REFRESH_SECONDS", 30))
+DEFAULT_LOCATION = (40.7128, -74.0060)  # New York
+
+logger = logging.getLogger("geo_client")
+
+
+class TTLCache:
+    """Thread-safe LRU of values that expire ttl_seconds after they were stored"""
+
+    def __init__(self, ttl_seconds, max_entries=MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+def make_session(retries=RETRIES, backoff_seconds=BACKOFF_SECONDS, pool_size=POOL_SIZE):
+    """Pooled session that retries connection errors, 429 and 5xx on GETs with exponential backoff
+
+    Read timeouts are not retried: the upstream is stalled, and another full
+    READ_TIMEOUT would only keep a lookup worker busy after the page gave up.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retry = Retry(
+        total=retries, connect=min(retries, CONNECT_RETRIES), read=False, backoff_factor=backoff_seconds,
+        status_forcelist=(429, 500, 502, 503, 504), allowed_methods=("GET",), respect_retry_after_header=True
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class GeoClient:
+    """UV index and reverse geocoding over one pooled session, cached on rounded coordinates"""
+
+    def __init__(self, weather_url=WEATHER_URL, weather_key=WEATHER_KEY, geocode_url=GEOCODE_URL,
+                 geocode_key=GEOCODE_KEY, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), session=None):
+        self.weather_url = weather_url
+        self.weather_key = weather_key
+        self.geocode_url = geocode_url
+        self.geocode_key = geocode_key
+        self.timeout = timeout
+        self.session = session or make_session()
+        self.uv_cache = TTLCache(UV_TTL_SECONDS)
+        self.geocode_cache = TTLCache(GEOCODE_TTL_SECONDS)
+        # one pool per upstream, so a stalled geocoder can never queue ahead of UV lookups
+        self._uv_pool = ThreadPoolExecutor(LOOKUP_WORKERS, thread_name_prefix="geo-uv")
+        self._geocode_pool = ThreadPoolExecutor(LOOKUP_WORKERS, thread_name_prefix="geo-geocode")
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def _get_json(self, url, params, timeout=None):
+        response = self.session.get(url, params=params, timeout=timeout or self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def _uv_key(self, latitude, longitude):
+        return round(float(latitude), UV_DECIMALS), round(float(longitude), UV_DECIMALS)
+
+    def _geocode_key(self, latitude, longitude):
+        return round(float(latitude), GEOCODE_DECIMALS), round(float(longitude), GEOCODE_DECIMALS)
+
+    def _fetch_uv(self, key, timeout=None):
+        data = self._get_json(self.weather_url, {"key": self.weather_key, "q": f"{key[0]},{key[1]}"}, timeout)
+        uv = data["current"]["uv"]
+        self.uv_cache.put(key, uv)
+        return uv
+
+    def _fetch_address(self, key, timeout=None):
+        data = self._get_json(
+            self.geocode_url, {"key": self.geocode_key, "q": f"{key[0]},{key[1]}", "no_annotations": 1}, timeout
+        )
+        address = data["results"][0]["formatted"]
+        self.geocode_cache.put(key, address)
+        return address
+
+    def uv_index(self, latitude, longitude, timeout=None):
+        """Current UV index from weatherapi.com"""
+        key = self._uv_key(latitude, longitude)
+        uv = self.uv_cache.get(key)
+        return self._fetch_uv(key, timeout) if uv is None else uv
+
+    def reverse_geocode(self, latitude, longitude, timeout=None):
+        """Formatted address of the nearest place from OpenCage"""
+        key = self._geocode_key(latitude, longitude)
+        address = self.geocode_cache.get(key)
+        return self._fetch_address(key, timeout) if address is None else address
+
+    def lookup(self, latitude, longitude):
+        """UV and address as futures keyed uv and location; cache hits come back already done,
+        misses run on their upstream's own pool"""
+        uv_key = self._uv_key(latitude, longitude)
+        geocode_key = self._geocode_key(latitude, longitude)
+        return {
+            "uv": self._cached_or_submit(self.uv_cache, self._uv_pool, self._fetch_uv, uv_key),
+            "location": self._cached_or_submit(
+                self.geocode_cache, self._geocode_pool, self._fetch_address, geocode_key
+            ),
+        }
+
+    def _cached_or_submit(self, cache, pool, fetch, key):
+        """Done future for a cache hit, else the request already running for key, else a new one,
+        so reruns during a stall wait on the same request instead of queueing more"""
+        value = cache.get(key)
+        if value is not None:
+            future = Future()
+            future.set_result(value)
+            return future
+        in_flight = (fetch.__name__, key)
+        with self._lock:
+            future = self._in_flight.get(in_flight)
+            if future is not None:
+                return future
+            future = self._in_flight[in_flight] = pool.submit(fetch, key)
+        future.add_done_callback(lambda _: self._finished(in_flight))  # runs at once if already done
+        return future
+
+    def _finished(self, in_flight):
+        with self._lock:
+            self._in_flight.pop(in_flight, None)
+
+    def stats(self):
+        return {"uv": self.uv_cache.stats(), "geocode": self.geocode_cache.stats()}
+
+
+def failure_reason(error):
+    """Short, user-safe description of a failed lookup; request errors carry URLs with API keys"""
+    import requests
+
+    if isinstance(error, (TimeoutError, requests.Timeout)):
+        return "timed out"
+    response = getattr(error, "response", None)
+    if response is not None:
+        return f"HTTP {response.status_code}"
+    return "service unavailable"
+
+
+def completed(lookups, timeout=LOOKUP_TIMEOUT):
+    """Yield (name, result, error) as each lookup finishes; those still running at the deadline get TimeoutError"""
+    names = {future: name for name, future in lookups.items()}
+    try:
+        for future in as_completed(names, timeout=timeout):
+            error = future.exception()
+            name = names.pop(future)
+            if error:
+                logger.warning("%s lookup failed", name, exc_info=error)
+            yield name, None if error else future.result(), error
+    except TimeoutError:
+        for future, name in names.items():
+            # only abandons the request: a running future cannot be cancelled, so its worker stays
+            # busy until the requests timeout ends it (see LOOKUP_WORKERS); cancel() drops queued ones
+            future.cancel()
+            logger.warning("%s lookup took longer than %gs", name, timeout)
+            yield name, None, TimeoutError(f"{name} lookup took longer than {timeout:g}s")
+
+
+@st.cache_resource
+def get_geo_client():
+    """Client shared by every session of this server"""
+    return GeoClient()
+
+
+def observer_location():
+    """Browser location as (lat, lon, source), answered by the geolocation component in one round trip
+
+    The last fix is kept in the session, so after refresh_location the page keeps
+    showing it until the browser answers; only the very first run waits.
+    """
+    from streamlit_js_eval import get_geolocation
+
+    location = get_geolocation(component_key=f"geolocation-{st.session_state.get('location_request', 0)}")
+    coords = location.get("coords") if isinstance(location, dict) else None
+    if coords:
+        st.session_state["observer_location"] = (coords["latitude"], coords["longitude"], "device")
+    elif location is not None and "observer_location" not in st.session_state:  # denied or unavailable
+        st.session_state["observer_location"] = DEFAULT_LOCATION + ("default (New York)",)
+    if "observer_location" not in st.session_state:
+        st.caption("Waiting for your location...")
+        st.stop()
+    return st.session_state["observer_location"]
+
+
+def refresh_location():
+    """Ask the browser for a new fix; requests within LOCATION_REFRESH_SECONDS of the last one are ignored"""
+    now = time.time()
+    if now - st.session_state.get("location_requested_at", 0.0) < LOCATION_REFRESH_SECONDS:
+        return False
+    st.session_state["location_requested_at"] = now
+    st.session_state["location_request"] = st.session_state.get("location_request", 0) + 1
+    return True
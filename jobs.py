@@ -0,0 +1,220 @@
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+MAX_WORKERS = int(os.environ.get("AUDIO_MAX_WORKERS", 1))
+MAX_PENDING = int(os.environ.get("AUDIO_MAX_PENDING", 8))
+PIN_WORKERS = os.environ.get("AUDIO_PIN_WORKERS", "1") != "0"
+JOB_TTL_SECONDS = float(os.environ.get("AUDIO_JOB_TTL_SECONDS", 3600))
+MAX_RESUBMITS = int(os.environ.get("AUDIO_MAX_RESUBMITS", 1))
+
+_progress = None
+
+
+class QueueFull(RuntimeError):
+    pass
+
+
+def worker_cores(slot, max_workers):
+    """Disjoint slice of the usable cores for the worker in `slot`"""
+    available = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else []
+    if len(available) < max_workers:
+        return None
+    per_worker = len(available) // max_workers
+    start = (slot % max_workers) * per_worker
+    return set(available[start:start + per_worker])
+
+
+def _init_worker(progress, slots, max_workers):
+    """Pin the worker to its cores, preload the models once and publish their load stats"""
+    global _progress
+    _progress = progress
+    import models
+
+    with slots.get_lock():
+        slot = slots.value
+        slots.value += 1
+    cores = worker_cores(slot, max_workers) if PIN_WORKERS and not os.environ.get("AUDIO_CPU_CORES") else None
+    models.configure_cpu(
+        inter_threads=models.INTER_OP_THREADS or 1,
+        cores=cores
+    )
+    models.warm_up("demucs", "freevc")
+    _progress[f"worker:{os.getpid()}"] = models.model_stats()
+
+
+def _ready():
+    """No-op submitted once per worker so the pool spawns and warms up before the first job"""
+    return os.getpid()
+
+
+def _run_job(job_id, song_bytes, sample_bytes, options):
+    if job_id not in _progress:  # forgotten while it waited in the pool's call queue
+        return None
+    import audio
+    import profiling
+
+    stages = {}
+
+    def report(stage, message, preview=None):
+        stages.setdefault(stage, time.time())
+        if preview is not None:  # stored once under its own key, not copied with every progress update
+            _progress[f"preview:{job_id}"] = preview
+        info = dict(_progress[job_id])
+        info.update(state="running", stage=stage, message=message, stages=dict(stages))
+        if preview is not None:
+            info["has_preview"] = True
+        _progress[job_id] = info
+
+    cprofile = options.pop("cprofile", False)
+    with profiling.Profiler(cprofile=cprofile) as profiler:
+        result = audio.run_pipeline(song_bytes, sample_bytes, report=report, **options)
+    info = dict(_progress[job_id])
+    info["finished"] = time.time()
+    info["profile"] = profiler.records
+    if cprofile:
+        info["cprofile"] = profiler.cprofile_dump()
+    _progress[job_id] = info
+    return result
+
+
+def stage_durations(status):
+    """Seconds spent in each stage reported so far, in the order they started"""
+    stages = sorted(status.get("stages", {}).items(), key=lambda item: item[1])
+    end = status.get("finished", time.time())
+    starts = [started for _, started in stages[1:]] + [end]
+    return {name: next_start - started for (name, started), next_start in zip(stages, starts)}
+
+
+class JobQueue:
+    """Bounded pool of worker processes that run audio jobs with preloaded models"""
+
+    def __init__(self, max_workers=MAX_WORKERS, max_pending=MAX_PENDING, job_ttl_seconds=JOB_TTL_SECONDS):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.job_ttl_seconds = job_ttl_seconds
+        self._context = multiprocessing.get_context("spawn")
+        self._manager = self._context.Manager()
+        self._progress = self._manager.dict()
+        self._slots = self._context.Value("i", 0)
+        self._requests = {}
+        self._futures = {}
+        self._finished = {}
+        self._lock = threading.RLock()
+        self._executor = self._start_executor()
+
+    def _start_executor(self):
+        """New pool whose workers are spawned and warmed up now rather than inside the first job"""
+        executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=self._context,
+            initializer=_init_worker,
+            initargs=(self._progress, self._slots, self.max_workers)
+        )
+        for _ in range(self.max_workers):
+            executor.submit(_ready)
+        return executor
+
+    def _restart_executor(self):
+        """Replace a pool broken by a dead worker; only the job that was running on it fails"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        for key in [key for key in self._progress.keys() if key.startswith("worker:")]:
+            self._progress.pop(key, None)
+        self._executor = self._start_executor()
+
+    def _expire(self):
+        """Drop results and progress of jobs that finished more than job_ttl_seconds ago"""
+        deadline = time.monotonic() - self.job_ttl_seconds
+        for job_id in [job_id for job_id, finished in self._finished.items() if finished < deadline]:
+            self._forget(job_id)
+
+    def _forget(self, job_id):
+        self._requests.pop(job_id, None)
+        future = self._futures.pop(job_id, None)
+        if future is not None:
+            future.cancel()  # only stops a job still waiting; _run_job skips one already handed to a worker
+        self._finished.pop(job_id, None)
+        self._progress.pop(job_id, None)
+        self._progress.pop(f"preview:{job_id}", None)
+
+    def pending(self):
+        return sum(not future.done() for future in self._futures.values())
+
+    def submit(self, song_bytes, sample_bytes, **options):
+        """Queue a job and return its ID; options are passed to audio.run_pipeline"""
+        with self._lock:
+            self._expire()
+            if self.pending() >= self.max_pending:
+                raise QueueFull("The server is busy with other songs, please try again in a few minutes")
+            job_id = uuid.uuid4().hex
+            self._progress[job_id] = {
+                "state": "queued",
+                "stage": None,
+                "message": "Waiting for a free worker...",
+                "submitted": time.time(),
+            }
+            self._requests[job_id] = (song_bytes, sample_bytes, options)
+            self._submit(job_id)
+        return job_id
+
+    def _submit(self, job_id):
+        """Hand a job to the pool, replacing the pool first if a dead worker broke it"""
+        try:
+            future = self._executor.submit(_run_job, job_id, *self._requests[job_id])
+        except BrokenProcessPool:
+            self._restart_executor()
+            future = self._executor.submit(_run_job, job_id, *self._requests[job_id])
+        self._futures[job_id] = future
+        future.add_done_callback(lambda done: self._job_done(job_id, done))
+
+    def _job_done(self, job_id, future):
+        with self._lock:
+            if self._futures.get(job_id) is not future:
+                return
+            broken = not future.cancelled() and isinstance(future.exception(), BrokenProcessPool)
+            info = self._progress.get(job_id, {})
+            # never started: the worker that died was running another job. Bounded, so workers
+            # that die during start-up (a failing warm-up) fail the job instead of respawning forever
+            if broken and info.get("state") == "queued" and info.get("resubmits", 0) < MAX_RESUBMITS:
+                self._progress[job_id] = {**info, "resubmits": info.get("resubmits", 0) + 1}
+                self._submit(job_id)
+                return
+            self._requests.pop(job_id, None)
+            self._finished[job_id] = time.monotonic()
+
+    def status(self, job_id):
+        """Latest progress of a job, or None if the job is unknown or has expired"""
+        with self._lock:
+            self._expire()
+        future = self._futures.get(job_id)
+        if future is None:
+            return None
+        info = dict(self._progress.get(job_id, {}))
+        if future.done():
+            error = future.exception()
+            info["state"] = "failed" if error else "done"
+            if error:
+                info["error"] = str(error)
+        return info
+
+    def result(self, job_id):
+        return self._futures[job_id].result()
+
+    def preview(self, job_id):
+        """MP3 bytes of the first finished section of a streaming job, or None"""
+        return self._progress.get(f"preview:{job_id}")
+
+    def forget(self, job_id):
+        with self._lock:
+            self._forget(job_id)
+
+    def worker_stats(self):
+        return {key: value for key, value in self._progress.items() if key.startswith("worker:")}
+
+    def shutdown(self):
+        self._executor.shutdown(cancel_futures=True)
+        self._manager.shutdown()
@@ -1,11 +1,6 @@
 import streamlit as st
-from extra_streamlit_components import CookieManager
-import requests
-import matplotlib.pyplot as plt
-import numpy as np
-from streamlit_js_eval import streamlit_js_eval
-import pandas as pd
-from opencage.geocoder import OpenCageGeocode
+from geo_client import completed, failure_reason, get_geo_client, observer_location, refresh_location
+import uv_gauge
 
 
 st.markdown('''<style>div[data-testid="stToolbar"] {
@@ -18,65 +13,26 @@ st.markdown('''<style>iframe{
 </style>''',unsafe_allow_html=True)
 
 
-# JavaScript code to get the user's location and update URL parameters
-js_code = """
-<script>
-function getLocation() {
-    if (navigator.geolocation) {
-        navigator.geolocation.getCurrentPosition(showPosition);
-    } else {
-        document.getElementById("location").innerHTML = "Geolocation is not supported by this browser.";
-    }
-}
-
-function showPosition(position) {
-    const latitude = position.coords.latitude;
-    const longitude = position.coords.longitude;
-    
-    document.cookie = "latitude=" + latitude + "; path=/";
-    document.cookie = "longitude=" + longitude + "; path=/";
-}
-
-getLocation();
-</script>
-
-"""
-
-# Embed the JavaScript code in Streamlit
-st.components.v1.html(js_code)
-
-cookie_manager = CookieManager()
-
-
-# Get a cookie
-cookies = cookie_manager.get_all()
+# The geolocation component hands the coordinates straight back to this run;
+# no cookies, no reload. UV and address are then served from geo_client's
+# per-region caches, shared by every session in the same rounded cell.
+lat, long, source = observer_location()
 
-try :
-    lat = cookies['latitude']
+if source == "device":
     st.write("Latitude : " , lat)
     
-    long = cookies['longitude']
     st.write("longitude : " , long)
 
 
-    def get_uv_index(api_key, latitude, longitude):
-        url = f"http://api.weatherapi.com/v1/current.json?key={api_key}&q={lat},{long}"
-        response = requests.get(url)
-        data = response.json()
-        uv_index = data['current']['uv']
-        return uv_index
-    
-    # Example usage
-    api_key = 'f3fec67a02fe41d58e8114039242710'
-    uv_index = get_uv_index(api_key, lat, long)
-    st.write(f"The UV index for your location is {uv_index}.")
-    
-    key = '9221b753d53f431d96d09fadc23fe420'
-    geocoder = OpenCageGeocode(key)
-    
-    results = geocoder.reverse_geocode(lat, long)
-    location = results[0]['formatted']
-    st.write("Location : ",location)
+    # Pooled, retried and cached on rounded coordinates, shared by every session.
+    # UV and address are fetched concurrently and each renders as soon as it arrives.
+    geo_client = get_geo_client()
+    lookups = geo_client.lookup(lat, long)
+    uv_slot = st.empty()
+    location_slot = st.empty()
+    uv_details_slot = st.empty()
+    uv_slot.caption("Fetching the UV index...")
+    location_slot.caption("Looking up your address...")
     
     def sunscreen_recommender(uv_index):
         if uv_index < 3:
@@ -90,53 +46,34 @@ try :
         else:
             return "Extreme risk. Use SPF 50+ sunscreen and avoid going outside."
     
-    # Example usage
-    recommendation = sunscreen_recommender(uv_index)
-    st.write(f"UV Index: {uv_index} - Recommendation: {recommendation}")
-  
-    def get_uv_color(uv_index):
-        if uv_index <= 2:
-            return 'green'
-        elif uv_index <= 5:
-            return 'yellow'
-        elif uv_index <= 7:
-            return 'orange'
-        elif uv_index <= 10:
-            return 'red'
-        else:
-            return 'red'
-    
-        # Function to display UV index on a reversed gradient scale with a pointer and transparent background
+    # Static CSS gradient plus a positioned pointer, cached per rounded UV value
     def display_uv_index(uv_index):
-        fig, ax = plt.subplots(figsize=(6, 1))
-        gradient = np.linspace(1, 0, 256)  # Reverse the gradient
-        gradient = np.vstack((gradient, gradient))
+        st.markdown(uv_gauge.gauge_html(uv_index), unsafe_allow_html=True)
     
-        ax.imshow(gradient, aspect='auto', cmap=plt.get_cmap('RdYlGn'))
-        ax.set_axis_off()
+    def show_uv_details(uv_index):
+        recommendation = sunscreen_recommender(uv_index)
+        st.write(f"UV Index: {uv_index} - Recommendation: {recommendation}")
+        st.markdown("<h4>UV Index Display</h4>", unsafe_allow_html=True)
+        display_uv_index(uv_index)
     
-        color = get_uv_color(uv_index)
-        
-        # Calculate the position of the pointer
-        pointer_position = uv_index / 11.0
-    
-        # Add a pointer to the gradient
-        ax.annotate('▼', xy=(pointer_position, -0.1), xycoords='axes fraction', color=color, fontsize=20, ha='center')
-        ax.text(0.5, -0.5, f'UV Index: {uv_index}', color=color, fontsize=15, ha='center', va='center', transform=ax.transAxes)
-    
-        # Set transparent background
-        fig.patch.set_alpha(0.0)
-        ax.patch.set_alpha(0.0)
-    
-        st.pyplot(fig)
-    
-    # Streamlit app
-    st.markdown("<h4>UV Index Display</h4>", unsafe_allow_html=True)
-    display_uv_index(uv_index)
+    # errors are logged in full on the server; the page only gets a reason without URLs or keys
+    for name, result, error in completed(lookups):
+        if name == "uv":
+            if error:
+                uv_slot.error(f"UV index unavailable ({failure_reason(error)})")
+                uv_details_slot.empty()
+                continue
+            uv_slot.write(f"The UV index for your location is {result}.")
+            with uv_details_slot.container():
+                show_uv_details(result)
+        elif error:
+            location_slot.warning(f"Location unavailable ({failure_reason(error)})")
+        else:
+            location_slot.write("Location : ", result)
 
-except :
+else:
     st.warning("Turn on Location")
 
 
-if st.button("Refresh") :
-      streamlit_js_eval(js_expressions="parent.window.location.reload()")
+# Re-asks the browser in place, at most once per LOCATION_REFRESH_SECONDS
+st.button("Refresh", on_click=refresh_location)
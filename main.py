@@ -1,8 +1,18 @@
+import json
 import streamlit as st
 import streamlit.components.v1 as components
+import geo_client
+import sky_cache
+import sky_catalogue
+import orientation_filter
 
 st.title("AR Planet Viewer")
 
+lat, lon, location_source = geo_client.observer_location()
+position_cache = sky_cache.get_position_cache()
+renderer = sky_cache.renderer_mode()
+planets = position_cache.get(lat, lon)
+
 orientation_js = """
 <!-- ========== HTML FIRST so DOM elements exist ========== -->
 <div id="statusBar" style="background:#222;color:#0f0;padding:8px 12px;font-family:monospace;font-size:13px;max-height:120px;overflow-y:auto;border-bottom:2px solid #0f0;">
@@ -11,8 +21,8 @@ orientation_js = """
 
 <div style="position:relative;width:100%;height:480px;background:#1a1a2e;">
   <video id="video" autoplay playsinline muted style="width:100%;height:100%;object-fit:cover;"></video>
+  <canvas id="skyLayer" style="position:absolute;top:0;left:0;width:100%;height:100%;pointer-events:none;"></canvas>
   <div id="planetOverlay" style="position:absolute;top:0;left:0;width:100%;height:100%;pointer-events:none;">
-    <div id="planetData" style="display:none;"></div>
   </div>
 </div>
 
@@ -38,9 +48,7 @@ orientation_js = """
 
 <pre id="responseData" style="background:#f0f0f0;padding:10px;font-size:11px;max-height:200px;overflow:auto;display:none;"></pre>
 
-<!-- ========== Three.js loaded BEFORE our code ========== -->
-<script src="https://cdnjs.cloudflare.com/ajax/libs/three.js/r127/three.min.js"></script>
-
+__ORIENTATION_FILTER__
 <script>
 (function() {
   // --- Status logging (replaces content, never grows) ---
@@ -54,12 +62,68 @@ orientation_js = """
 
   setStatus('Script started');
 
-  // Check Three.js
-  if (typeof THREE === 'undefined') {
-    setStatus('ERROR: Three.js failed to load');
-    return;
+  // --- Render state: sensor and slider events only record the latest angles,
+  // one requestAnimationFrame callback per frame applies them ---
+  var H_FOV = 70, V_FOV = 56;
+  var DEG = Math.PI / 180;
+  var orientation = new Float64Array(3);  // alpha, beta, gamma in degrees
+  var orientationSource = 'Manual';
+  var rotation = new Float64Array(9);     // row-major YXZ rotation, rebuilt once per frame
+  var count = 0;
+  var unitVectors = new Float32Array(0);  // x, y, z per planet
+  var visible = new Uint8Array(0);
+  var markers = [];
+  var planetNames = [];
+  var planetX = new Float32Array(0), planetY = new Float32Array(0);
+  var labelWidths = new Float32Array(0);
+  var PLANET_FONT = 'bold 16px sans-serif';
+  var overlayWidth = 0, overlayHeight = 0;
+  var tanHalfH = Math.tan(H_FOV * DEG / 2), tanHalfV = Math.tan(V_FOV * DEG / 2);
+  var frameRequested = false;
+  var filter = OrientationFilter();
+
+  var overlay = document.getElementById('planetOverlay');
+  var skyCanvas = document.getElementById('skyLayer');
+  var skyContext = skyCanvas.getContext && skyCanvas.getContext('2d');
+  // 'canvas' draws stars, planets and labels in one pass; 'dom' keeps one element per planet
+  var canvasMode = '__RENDERER__' === 'canvas' && !!skyContext;
+  var orientationDisplay = document.getElementById('orientationDisplay');
+  var sliders = ['alpha', 'beta', 'gamma'].map(function(name) {
+    return {
+      input: document.getElementById(name + 'Slider'),
+      label: document.getElementById(name + 'Value')
+    };
+  });
+
+  function requestFrame() {
+    if (!frameRequested) {
+      frameRequested = true;
+      requestAnimationFrame(renderFrame);
+    }
+  }
+
+  function setOrientation(a, b, g, source) {
+    orientation[0] = a;
+    orientation[1] = b;
+    orientation[2] = g;
+    orientationSource = source;
+    requestFrame();
+  }
+
+  function measureOverlay() {
+    overlayWidth = overlay.clientWidth;
+    overlayHeight = overlay.clientHeight;
+    if (skyContext) {
+      var ratio = window.devicePixelRatio || 1;
+      skyCanvas.width = Math.round(overlayWidth * ratio);
+      skyCanvas.height = Math.round(overlayHeight * ratio);
+      skyContext.setTransform(ratio, 0, 0, ratio, 0, 0);
+    }
+    filter.invalidate();
+    requestFrame();
   }
-  setStatus('Three.js loaded OK');
+  window.addEventListener('resize', measureOverlay);
+  measureOverlay();
 
   // --- Camera ---
   (async function startCamera() {
@@ -74,13 +138,8 @@ orientation_js = """
   })();
 
   // --- Orientation ---
-  var currentAlpha = 0, currentBeta = 0, currentGamma = 0;
-
-  function updateOrientationDisplay(a, b, g, source) {
-    document.getElementById('orientationDisplay').innerText =
-      'A:' + a.toFixed(1) + ' B:' + b.toFixed(1) + ' G:' + g.toFixed(1) + ' (' + source + ')';
-  }
-
+  var sensorActive = false;
+  var settleTimer = null;
   if (window.DeviceOrientationEvent) {
     // iOS 13+ permission
     if (typeof DeviceOrientationEvent.requestPermission === 'function') {
@@ -91,163 +150,290 @@ orientation_js = """
     }
     window.addEventListener('deviceorientation', function(e) {
       if (e.alpha !== null || e.beta !== null || e.gamma !== null) {
-        currentAlpha = e.alpha || 0;
-        currentBeta = e.beta || 0;
-        currentGamma = e.gamma || 0;
-        updateOrientationDisplay(currentAlpha, currentBeta, currentGamma, 'Device');
-        document.getElementById('alphaSlider').value = currentAlpha;
-        document.getElementById('betaSlider').value = currentBeta;
-        document.getElementById('gammaSlider').value = currentGamma;
-        document.getElementById('alphaValue').textContent = currentAlpha.toFixed(0);
-        document.getElementById('betaValue').textContent = currentBeta.toFixed(0);
-        document.getElementById('gammaValue').textContent = currentGamma.toFixed(0);
-        updatePlanetPositions(currentAlpha, currentBeta, currentGamma);
+        sensorActive = true;
+        filter.push(e.alpha || 0, e.beta || 0, e.gamma || 0, e.timeStamp || performance.now());
+        setOrientation(e.alpha || 0, e.beta || 0, e.gamma || 0, 'Device');
+        // once readings stop, draw the settled pose instead of the last extrapolated one
+        clearTimeout(settleTimer);
+        settleTimer = setTimeout(requestFrame, filter.predictionWindowMs + 1);
       }
     }, false);
   }
-  setTimeout(function() { setStatus('Orientation: ' + (currentAlpha || currentBeta || currentGamma ? 'active' : 'no sensor, use sliders')); }, 2000);
+  setTimeout(function() { setStatus('Orientation: ' + (sensorActive ? 'active' : 'no sensor, use sliders')); }, 2000);
 
   // --- Manual sliders ---
   function onSliderChange() {
-    var a = parseFloat(document.getElementById('alphaSlider').value);
-    var b = parseFloat(document.getElementById('betaSlider').value);
-    var g = parseFloat(document.getElementById('gammaSlider').value);
-    document.getElementById('alphaValue').textContent = a;
-    document.getElementById('betaValue').textContent = b;
-    document.getElementById('gammaValue').textContent = g;
-    updateOrientationDisplay(a, b, g, 'Manual');
-    updatePlanetPositions(a, b, g);
+    var a = parseFloat(sliders[0].input.value);
+    var b = parseFloat(sliders[1].input.value);
+    var g = parseFloat(sliders[2].input.value);
+    filter.reset(a, b, g);
+    setOrientation(a, b, g, 'Manual');
   }
-  document.getElementById('alphaSlider').addEventListener('input', onSliderChange);
-  document.getElementById('betaSlider').addEventListener('input', onSliderChange);
-  document.getElementById('gammaSlider').addEventListener('input', onSliderChange);
-
-  // --- Screen position calculation ---
-  function getScreenPosition(azimuth, altitude, alpha, beta, gamma, hFov, vFov) {
-    var azRad = THREE.MathUtils.degToRad(azimuth);
-    var altRad = THREE.MathUtils.degToRad(altitude);
-    var x = Math.cos(altRad) * Math.sin(azRad);
-    var y = Math.sin(altRad);
-    var z = Math.cos(altRad) * Math.cos(azRad);
-    var pos = new THREE.Vector3(x, y, z);
-
-    var euler = new THREE.Euler(
-      THREE.MathUtils.degToRad(beta),
-      THREE.MathUtils.degToRad(alpha),
-      THREE.MathUtils.degToRad(gamma),
-      'YXZ'
-    );
-    pos.applyEuler(euler);
-
-    if (pos.z <= 0.01) return null; // behind camera
-
-    var hFovRad = THREE.MathUtils.degToRad(hFov);
-    var vFovRad = THREE.MathUtils.degToRad(vFov);
-    var sx = (pos.x / pos.z) / Math.tan(hFovRad / 2);
-    var sy = (pos.y / pos.z) / Math.tan(vFovRad / 2);
-
-    var px = (sx * 0.5 + 0.5) * 100;
-    var py = (0.5 - sy * 0.5) * 100;
-
-    if (px < -20 || px > 120 || py < -20 || py > 120) return null;
-    return { x: px, y: py };
+  sliders.forEach(function(slider) { slider.input.addEventListener('input', onSliderChange); });
+
+  // --- Rotation matrix from the filtered orientation quaternion ---
+  function updateRotation(q) {
+    var x = q[0], y = q[1], z = q[2], w = q[3];
+    var x2 = x + x, y2 = y + y, z2 = z + z;
+    var xx = x * x2, xy = x * y2, xz = x * z2, yy = y * y2, yz = y * z2, zz = z * z2;
+    var wx = w * x2, wy = w * y2, wz = w * z2;
+    rotation[0] = 1 - (yy + zz); rotation[1] = xy - wz;       rotation[2] = xz + wy;
+    rotation[3] = xy + wz;       rotation[4] = 1 - (xx + zz); rotation[5] = yz - wx;
+    rotation[6] = xz - wy;       rotation[7] = yz + wx;       rotation[8] = 1 - (xx + yy);
   }
 
-  // --- Update planet positions ---
-  function updatePlanetPositions(alpha, beta, gamma) {
-    var el = document.getElementById('planetData');
-    if (!el || !el.innerText) return;
-    var planets = JSON.parse(el.innerText);
-    planets.forEach(function(p) {
-      var pos = getScreenPosition(p.azimuth, p.altitude, alpha, beta, gamma, 70, 56);
-      var div = document.getElementById('planet_' + p.name);
-      if (!div) return;
-      if (pos) {
-        div.style.left = pos.x + '%';
-        div.style.top = pos.y + '%';
-        div.style.display = 'block';
-      } else {
-        div.style.display = 'none';
+  // --- One frame: rotate every unit vector, project, then draw on the canvas or move DOM markers ---
+  function renderFrame() {
+    frameRequested = false;
+    // Skip the frame entirely while the filtered view moves less than the pixel threshold
+    var q = filter.sample(performance.now(), overlayWidth / 2 / tanHalfH);
+    if (!q) return;
+    var alpha = orientation[0], beta = orientation[1], gamma = orientation[2];
+
+    orientationDisplay.textContent =
+      'A:' + alpha.toFixed(1) + ' B:' + beta.toFixed(1) + ' G:' + gamma.toFixed(1) + ' (' + orientationSource + ')';
+    for (var s = 0; s < 3; s++) {
+      if (orientationSource === 'Device') sliders[s].input.value = orientation[s];
+      sliders[s].label.textContent = orientation[s].toFixed(0);
+    }
+
+    updateRotation(q);
+    drawSky();
+    var r = rotation;
+    for (var i = 0; i < count; i++) {
+      var x = unitVectors[3 * i], y = unitVectors[3 * i + 1], z = unitVectors[3 * i + 2];
+      var rz = r[6] * x + r[7] * y + r[8] * z;
+      var show = false, px = 0, py = 0;
+      if (rz > 0.01) { // in front of the camera
+        var sx = (r[0] * x + r[1] * y + r[2] * z) / rz / tanHalfH;
+        var sy = (r[3] * x + r[4] * y + r[5] * z) / rz / tanHalfV;
+        px = sx * 0.5 + 0.5;
+        py = 0.5 - sy * 0.5;
+        show = px >= -0.2 && px <= 1.2 && py >= -0.2 && py <= 1.2;
       }
-    });
+      if (canvasMode) {
+        visible[i] = show ? 1 : 0;
+        planetX[i] = px * overlayWidth;
+        planetY[i] = py * overlayHeight;
+        continue;
+      }
+      var style = markers[i].style;
+      if (show) {
+        style.transform = 'translate3d(' + (px * overlayWidth).toFixed(1) + 'px,' +
+          (py * overlayHeight).toFixed(1) + 'px,0) translate(-50%,-50%)';
+      }
+      if (show !== (visible[i] === 1)) {
+        visible[i] = show ? 1 : 0;
+        style.visibility = show ? 'visible' : 'hidden';
+      }
+    }
+    if (canvasMode) drawPlanets();
+  }
+
+  // --- Canvas mode: every visible planet's box, border and label as three batched draws ---
+  function drawPlanets() {
+    var ctx = skyContext;
+    ctx.beginPath();
+    for (var i = 0; i < count; i++) {
+      if (visible[i]) ctx.rect(planetX[i] - labelWidths[i] / 2 - 10, planetY[i] - 16, labelWidths[i] + 20, 32);
+    }
+    ctx.fillStyle = 'rgba(255,0,0,0.7)';
+    ctx.fill();
+    ctx.lineWidth = 2;
+    ctx.strokeStyle = 'yellow';
+    ctx.stroke();
+
+    ctx.font = PLANET_FONT;
+    ctx.textAlign = 'center';
+    ctx.textBaseline = 'middle';
+    for (var pass = 0; pass < 2; pass++) {
+      ctx.fillStyle = pass === 0 ? '#000' : '#fff'; // cheap shadow, then the label
+      for (var j = 0; j < count; j++) {
+        if (visible[j]) ctx.fillText(planetNames[j], planetX[j] + 1 - pass, planetY[j] + 1 - pass);
+      }
+    }
+    ctx.textAlign = 'start';
+    ctx.textBaseline = 'alphabetic';
+  }
+
+  // --- Star and deep-sky catalogue: equatorial float32 unit vectors sorted by sky grid cell ---
+  var SIDEREAL_RATE = 2 * Math.PI / 86164.0905; // rad per second
+  var STAR_SIZES = [4.5, 3.5, 2.6, 1.8, 1.2];     // px per brightness class, brightest first
+  var STAR_COLORS = ['rgba(255,255,255,1)', 'rgba(255,255,240,0.95)', 'rgba(240,240,255,0.8)',
+                     'rgba(220,225,255,0.6)', 'rgba(200,210,255,0.45)'];
+  var DEEP_SKY_CLASS = STAR_SIZES.length;
+  var sky = __SKY_CATALOGUE__;
+  var observer = __OBSERVER__;
+
+  function decode(b64, Type) {
+    var text = atob(b64), bytes = new Uint8Array(text.length);
+    for (var i = 0; i < text.length; i++) bytes[i] = text.charCodeAt(i);
+    return new Type(bytes.buffer);
   }
 
-  // --- Create planet elements ---
+  var skyVectors = decode(sky.vectors, Float32Array);
+  var skyMagnitudes = decode(sky.magnitudes, Float32Array);
+  var skyKinds = decode(sky.kinds, Uint8Array);
+  var cellStart = decode(sky.cellStart, Uint32Array);
+  var cellCenters = decode(sky.cellCenters, Float32Array);
+  var cellRadii = decode(sky.cellRadii, Float32Array);
+  var skyLabels = {};
+  sky.labels.forEach(function(label) { skyLabels[label[0]] = label[1]; });
+
+  // A cell can hold visible objects only if its centre lies within FOV radius + cell radius of the view axis
+  var fovRadius = Math.atan(Math.sqrt(tanHalfH * tanHalfH + tanHalfV * tanHalfV));
+  var cellCosLimit = new Float32Array(sky.cells);
+  for (var k = 0; k < sky.cells; k++) cellCosLimit[k] = Math.cos(Math.min(Math.PI, fovRadius + cellRadii[k]));
+
+  var skyClass = new Uint8Array(sky.count);
+  for (var i = 0; i < sky.count; i++) {
+    skyClass[i] = skyKinds[i] === 1 ? DEEP_SKY_CLASS :
+      Math.max(0, Math.min(STAR_SIZES.length - 1, Math.floor((skyMagnitudes[i] + 0.5) / 1.5)));
+  }
+  var skyX = new Float32Array(sky.count), skyY = new Float32Array(sky.count);
+  var skyOnScreen = new Uint32Array(sky.count);
+  var equatorialToHorizontal = new Float64Array(9);
+  var skyToScreen = new Float64Array(9);
+
+  // Rows: east, up, north (the planet vectors' x, y, z), for the current local sidereal angle
+  function updateEquatorial() {
+    var lst = observer.sidereal + (Date.now() / 1000 - observer.timestamp) * SIDEREAL_RATE;
+    var cl = Math.cos(lst), sl = Math.sin(lst);
+    var cp = Math.cos(observer.latitude), sp = Math.sin(observer.latitude);
+    var m = equatorialToHorizontal;
+    m[0] = -sl;      m[1] = cl;       m[2] = 0;
+    m[3] = cp * cl;  m[4] = cp * sl;  m[5] = sp;
+    m[6] = -sp * cl; m[7] = -sp * sl; m[8] = cp;
+  }
+
+  function drawSky() {
+    if (!skyContext) return;
+    updateEquatorial();
+    var a = rotation, b = equatorialToHorizontal, m = skyToScreen;
+    for (var row = 0; row < 3; row++) {
+      for (var col = 0; col < 3; col++) {
+        m[3 * row + col] = a[3 * row] * b[col] + a[3 * row + 1] * b[3 + col] + a[3 * row + 2] * b[6 + col];
+      }
+    }
+    skyContext.clearRect(0, 0, overlayWidth, overlayHeight);
+
+    // Cull by grid cell against the view axis (row 2), then project only the survivors
+    var n = 0;
+    for (var k = 0; k < sky.cells; k++) {
+      if (cellCenters[3 * k] * m[6] + cellCenters[3 * k + 1] * m[7] + cellCenters[3 * k + 2] * m[8] < cellCosLimit[k]) continue;
+      for (var i = cellStart[k], end = cellStart[k + 1]; i < end; i++) {
+        var x = skyVectors[3 * i], y = skyVectors[3 * i + 1], z = skyVectors[3 * i + 2];
+        var rz = m[6] * x + m[7] * y + m[8] * z;
+        if (rz <= 0.01) continue;
+        var px = ((m[0] * x + m[1] * y + m[2] * z) / rz / tanHalfH * 0.5 + 0.5) * overlayWidth;
+        var py = (0.5 - (m[3] * x + m[4] * y + m[5] * z) / rz / tanHalfV * 0.5) * overlayHeight;
+        if (px < 0 || px > overlayWidth || py < 0 || py > overlayHeight) continue;
+        skyX[n] = px;
+        skyY[n] = py;
+        skyOnScreen[n++] = i;
+      }
+    }
+
+    // One batched path per brightness class
+    for (var c = 0; c < STAR_SIZES.length; c++) {
+      var size = STAR_SIZES[c], half = size / 2;
+      skyContext.beginPath();
+      for (var j = 0; j < n; j++) {
+        if (skyClass[skyOnScreen[j]] === c) skyContext.rect(skyX[j] - half, skyY[j] - half, size, size);
+      }
+      skyContext.fillStyle = STAR_COLORS[c];
+      skyContext.fill();
+    }
+
+    skyContext.beginPath();
+    skyContext.strokeStyle = 'rgba(120,200,255,0.8)';
+    skyContext.fillStyle = 'rgba(120,200,255,0.9)';
+    skyContext.font = '11px monospace';
+    for (var j = 0; j < n; j++) {
+      var index = skyOnScreen[j];
+      if (skyClass[index] !== DEEP_SKY_CLASS) continue;
+      skyContext.moveTo(skyX[j] + 5, skyY[j]);
+      skyContext.arc(skyX[j], skyY[j], 5, 0, 2 * Math.PI);
+      if (skyMagnitudes[index] < 7 && skyLabels[index]) skyContext.fillText(skyLabels[index], skyX[j] + 7, skyY[j] + 4);
+    }
+    skyContext.stroke();
+  }
+
+  // The sky turns about 0.25 deg a minute; redraw now and then even when the phone is still
+  setInterval(function() { filter.invalidate(); requestFrame(); }, 10000);
+  setStatus('Catalogue: ' + sky.count + ' objects in ' + sky.cells + ' cells');
+
+  // --- Create planet elements (DOM mode only) and their typed-array geometry ---
   function createPlanetElements(planets) {
-    var overlay = document.getElementById('planetOverlay');
     if (!overlay) { setStatus('ERROR: planetOverlay not found'); return; }
-
-    // Keep planetData div, clear the rest
-    var dataDiv = document.getElementById('planetData');
     overlay.innerHTML = '';
-    overlay.appendChild(dataDiv);
 
+    count = planets.length;
+    unitVectors = new Float32Array(3 * count);
+    visible = new Uint8Array(count);
+    planetX = new Float32Array(count);
+    planetY = new Float32Array(count);
+    labelWidths = new Float32Array(count);
+    planetNames = planets.map(function(p) { return p.name; });
+    markers = [];
     var info = [];
+    if (skyContext) skyContext.font = PLANET_FONT;
     planets.forEach(function(p, i) {
+      var az = p.azimuth * DEG, alt = p.altitude * DEG;
+      unitVectors[3 * i] = Math.cos(alt) * Math.sin(az);
+      unitVectors[3 * i + 1] = Math.sin(alt);
+      unitVectors[3 * i + 2] = Math.cos(alt) * Math.cos(az);
+      info.push((i+1) + '. ' + p.name + ' Az:' + p.azimuth.toFixed(1) + ' Alt:' + p.altitude.toFixed(1));
+      if (canvasMode) {
+        labelWidths[i] = skyContext.measureText(p.name).width;
+        return;
+      }
+
       var div = document.createElement('div');
       div.id = 'planet_' + p.name;
       div.style.cssText = 'position:absolute;color:#fff;font-size:16px;font-weight:bold;' +
         'text-shadow:1px 1px 3px #000;padding:6px 10px;background:rgba(255,0,0,0.7);' +
         'border-radius:6px;border:2px solid yellow;z-index:100;pointer-events:none;' +
-        'left:50%;top:50%;display:block;transform:translate(-50%,-50%);';
+        'left:0;top:0;visibility:hidden;will-change:transform;';
       div.textContent = p.name;
       overlay.appendChild(div);
-      info.push((i+1) + '. ' + p.name + ' Az:' + p.azimuth.toFixed(1) + ' Alt:' + p.altitude.toFixed(1));
+      markers.push(div);
     });
-    setStatus('Created ' + planets.length + ' planets: ' + info.join(', '));
+    setStatus('Created ' + planets.length + ' planets (' + (canvasMode ? 'canvas' : 'dom') + '): ' + info.join(', '));
   }
 
-  // --- Fetch planet data ---
-  async function fetchPlanetData(lat, lon) {
-    setStatus('Fetching planets for ' + lat.toFixed(2) + ', ' + lon.toFixed(2));
-    try {
-      var resp = await fetch('https://api.visibleplanets.dev/v3?latitude=' + lat + '&longitude=' + lon);
-      if (!resp.ok) throw new Error('HTTP ' + resp.status);
-      var data = await resp.json();
-      if (!data.data || data.data.length === 0) throw new Error('No planets returned');
-      setStatus('API returned ' + data.data.length + ' planets');
-
-      // Fetch radius for each planet
-      for (var i = 0; i < data.data.length; i++) {
-        try {
-          var br = await fetch('https://api.le-systeme-solaire.net/rest/bodies/' + data.data[i].name.toLowerCase());
-          var bd = await br.json();
-          data.data[i].meanradius = bd.meanRadius || 0;
-        } catch(e) { data.data[i].meanradius = 0; }
-      }
-
-      document.getElementById('planetData').innerText = JSON.stringify(data.data);
-      document.getElementById('responseData').innerText = JSON.stringify(data, null, 2);
-      createPlanetElements(data.data);
-      updatePlanetPositions(0, 0, 0);
-    } catch(e) {
-      setStatus('API error: ' + e.message + ' - using fallback');
-      var fallback = [
-        { name: 'Venus', azimuth: 45, altitude: 30, meanradius: 6051 },
-        { name: 'Mars', azimuth: 120, altitude: 20, meanradius: 3389 },
-        { name: 'Jupiter', azimuth: 200, altitude: 45, meanradius: 69911 },
-        { name: 'Saturn', azimuth: 280, altitude: 15, meanradius: 58232 }
-      ];
-      document.getElementById('planetData').innerText = JSON.stringify(fallback);
-      createPlanetElements(fallback);
-      updatePlanetPositions(0, 0, 0);
+  // --- Planet data computed on the server ---
+  function loadPlanetData(data) {
+    if (data.length === 0) {
+      setStatus('No planets above the horizon right now');
+      return;
     }
+    setStatus('Server returned ' + data.length + ' planets');
+
+    document.getElementById('responseData').innerText = JSON.stringify(data, null, 2);
+    createPlanetElements(data);
+    filter.invalidate();
+    requestFrame();
   }
 
-  // --- Get location and start ---
-  setStatus('Requesting location...');
-  navigator.geolocation.getCurrentPosition(
-    function(pos) {
-      setStatus('Location: ' + pos.coords.latitude.toFixed(4) + ', ' + pos.coords.longitude.toFixed(4));
-      fetchPlanetData(pos.coords.latitude, pos.coords.longitude);
-    },
-    function(err) {
-      setStatus('Location error: ' + err.message + ' - using New York');
-      fetchPlanetData(40.7128, -74.0060);
-    }
-  );
+  setStatus('Location: __LOCATION__');
+  loadPlanetData(__PLANETS__);
 })();
 </script>
 """
 
-components.html(orientation_js, height=800)
+components.html(
+    orientation_js
+    .replace("__ORIENTATION_FILTER__", orientation_filter.script())
+    .replace("__PLANETS__", json.dumps(planets))
+    .replace("__SKY_CATALOGUE__", json.dumps(sky_cache.get_sky_catalogue()))
+    # frame for the cache bucket's start, not now: the client advances it with Date.now(), and a
+    # timestamp that changes on every rerun would change the HTML and reload the whole component
+    .replace("__OBSERVER__", json.dumps(sky_catalogue.observer_frame(lat, lon, position_cache.bucket_start())))
+    .replace("__RENDERER__", renderer)
+    .replace("__LOCATION__", f"{lat:.4f}, {lon:.4f} ({location_source})"),
+    height=800
+)
+
+with st.expander("Position cache"):
+    st.json(position_cache.stats())
@@ -0,0 +1,141 @@
+import gc
+import os
+import threading
+import time
+from importlib import metadata
+from profiling import current_rss
+
+FREEVC_MODEL_NAME = "voice_conversion_models/multilingual/vctk/freevc24"
+DEMUCS_MODEL_NAME = "htdemucs"
+
+MODEL_PACKAGES = {
+    "freevc": (FREEVC_MODEL_NAME, "TTS"),
+    "demucs": (DEMUCS_MODEL_NAME, "demucs"),
+}
+
+INTRA_OP_THREADS = int(os.environ.get("AUDIO_TORCH_THREADS", 0))
+INTER_OP_THREADS = int(os.environ.get("AUDIO_TORCH_INTEROP_THREADS", 0))
+QUANTIZE = os.environ.get("AUDIO_QUANTIZE", "").lower() in ("1", "true", "int8")
+
+_loaders = {}
+_models = {}
+_stats = {}
+_lock = threading.Lock()
+
+
+def register(name, loader):
+    """Register a loader that builds the model called `name`"""
+    _loaders[name] = loader
+
+
+def get_model(name):
+    """Return the loaded model, loading it on first use"""
+    model = _models.get(name)
+    if model is not None:
+        return model
+    with _lock:
+        if name not in _models:
+            rss_before = current_rss()
+            start = time.perf_counter()
+            _models[name] = _loaders[name]()
+            _stats[name] = {
+                "load_seconds": time.perf_counter() - start,
+                "rss_bytes": max(current_rss() - rss_before, 0),
+                "loaded_at": time.time(),
+            }
+        return _models[name]
+
+
+def warm_up(*names):
+    """Load the given models (all registered ones by default) ahead of the first job"""
+    for name in names or list(_loaders):
+        get_model(name)
+
+
+def evict(name=None):
+    """Drop one model (or all of them) so its memory can be reclaimed"""
+    with _lock:
+        for key in [name] if name else list(_models):
+            _models.pop(key, None)
+            _stats.pop(key, None)
+    gc.collect()
+
+
+def is_loaded(name):
+    return name in _models
+
+
+def parse_cores(spec):
+    """Turn a core list such as "0-3,6" into a set of CPU ids"""
+    cores = set()
+    for part in filter(None, spec.split(",")):
+        first, _, last = part.partition("-")
+        cores.update(range(int(first), int(last or first) + 1))
+    return cores
+
+
+def configure_cpu(intra_threads=INTRA_OP_THREADS, inter_threads=INTER_OP_THREADS, cores=None):
+    """Pin this process to `cores` and size torch's thread pools (0 keeps torch's default); call before the first model runs"""
+    if cores is None and os.environ.get("AUDIO_CPU_CORES"):
+        cores = parse_cores(os.environ["AUDIO_CPU_CORES"])
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+        intra_threads = intra_threads or len(cores)
+    if intra_threads:
+        os.environ["OMP_NUM_THREADS"] = str(intra_threads)
+        os.environ["MKL_NUM_THREADS"] = str(intra_threads)
+
+    import torch
+    if intra_threads:
+        torch.set_num_threads(intra_threads)
+    if inter_threads:
+        try:
+            torch.set_num_interop_threads(inter_threads)
+        except RuntimeError:
+            pass
+    return {"intra_op_threads": torch.get_num_threads(), "inter_op_threads": torch.get_num_interop_threads(),
+            "cores": sorted(cores) if cores else None}
+
+
+def quantize(module):
+    """Swap the Linear/LSTM layers of a model for int8 dynamically quantized ones, in place"""
+    import torch
+    return torch.ao.quantization.quantize_dynamic(
+        module, {torch.nn.Linear, torch.nn.LSTM}, dtype=torch.qint8, inplace=True
+    )
+
+
+def model_version(name):
+    """Identify the weights and library release behind a model, for cache keys"""
+    model_name, package = MODEL_PACKAGES[name]
+    try:
+        version = f"{model_name}@{metadata.version(package)}"
+    except metadata.PackageNotFoundError:
+        version = model_name
+    return f"{version}+int8" if QUANTIZE else version
+
+
+def model_stats():
+    """Load time and resident memory added by each loaded model"""
+    return {name: dict(stats) for name, stats in _stats.items()}
+
+
+def _load_freevc():
+    from TTS.api import TTS
+    tts = TTS(model_name=FREEVC_MODEL_NAME, progress_bar=False, gpu=False)
+    if QUANTIZE:
+        quantize(tts.voice_converter.vc_model)
+    return tts
+
+
+def _load_demucs():
+    from demucs.pretrained import get_model
+    model = get_model(DEMUCS_MODEL_NAME)
+    model.eval()
+    if QUANTIZE:
+        quantize(model)
+    return model
+
+
+register("freevc", _load_freevc)
+register("demucs", _load_demucs)
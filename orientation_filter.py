@@ -0,0 +1,160 @@
+import os
+
+SMOOTHING_MS = float(os.environ.get("AR_SMOOTHING_MS", 50))
+DEAD_BAND_DEGREES = float(os.environ.get("AR_DEAD_BAND_DEGREES", 0.15))
+PREDICTION_MS = float(os.environ.get("AR_PREDICTION_MS", 50))
+PIXEL_THRESHOLD = float(os.environ.get("AR_PIXEL_THRESHOLD", 0.5))
+
+# Shared by main.py and ar_planets.py. Raw deviceorientation angles become a
+# quaternion; samples inside the dead-band are dropped, the rest are slerped
+# into the smoothed orientation with time constant SMOOTHING_MS, and sample()
+# extrapolates the smoothed angular velocity PREDICTION_MS ahead. sample()
+# returns null unless the result moved the view by at least PIXEL_THRESHOLD px.
+FILTER_JS = """
+<script>
+function OrientationFilter(options) {
+  options = options || {};
+  var DEG = Math.PI / 180;
+  var smoothingMs = options.smoothingMs !== undefined ? options.smoothingMs : __SMOOTHING_MS__;
+  var deadBand = (options.deadBandDegrees !== undefined ? options.deadBandDegrees : __DEAD_BAND_DEGREES__) * DEG;
+  var predictionMs = options.predictionMs !== undefined ? options.predictionMs : __PREDICTION_MS__;
+  var pixelThreshold = options.pixelThreshold !== undefined ? options.pixelThreshold : __PIXEL_THRESHOLD__;
+  var PREDICTION_WINDOW_MS = 200;                 // no reading for this long: stop extrapolating
+
+  var raw = new Float64Array([0, 0, 0, 1]);       // x, y, z, w
+  var previousRaw = new Float64Array([0, 0, 0, 1]);
+  var smoothed = new Float64Array([0, 0, 0, 1]);
+  var predicted = new Float64Array([0, 0, 0, 1]);
+  var emitted = new Float64Array([0, 0, 0, 1]);
+  var step = new Float64Array(4);
+  var omega = new Float64Array(3);                // rad/ms, world frame
+  var lastTime = -1;
+  var started = false;
+  var force = true;
+
+  // Same convention as THREE.Euler(beta, alpha, gamma, 'YXZ')
+  function fromAngles(out, alpha, beta, gamma) {
+    var c1 = Math.cos(beta * DEG / 2), s1 = Math.sin(beta * DEG / 2);
+    var c2 = Math.cos(alpha * DEG / 2), s2 = Math.sin(alpha * DEG / 2);
+    var c3 = Math.cos(gamma * DEG / 2), s3 = Math.sin(gamma * DEG / 2);
+    out[0] = s1 * c2 * c3 + c1 * s2 * s3;
+    out[1] = c1 * s2 * c3 - s1 * c2 * s3;
+    out[2] = c1 * c2 * s3 - s1 * s2 * c3;
+    out[3] = c1 * c2 * c3 + s1 * s2 * s3;
+  }
+
+  function dot(a, b) { return a[0] * b[0] + a[1] * b[1] + a[2] * b[2] + a[3] * b[3]; }
+
+  function angleBetween(a, b) { return 2 * Math.acos(Math.min(1, Math.abs(dot(a, b)))); }
+
+  function copy(out, a) { out[0] = a[0]; out[1] = a[1]; out[2] = a[2]; out[3] = a[3]; }
+
+  function normalize(out) {
+    var n = Math.sqrt(dot(out, out));
+    out[0] /= n; out[1] /= n; out[2] /= n; out[3] /= n;
+  }
+
+  // out = a * b
+  function multiply(out, a, b) {
+    var x = a[3] * b[0] + a[0] * b[3] + a[1] * b[2] - a[2] * b[1];
+    var y = a[3] * b[1] - a[0] * b[2] + a[1] * b[3] + a[2] * b[0];
+    var z = a[3] * b[2] + a[0] * b[1] - a[1] * b[0] + a[2] * b[3];
+    var w = a[3] * b[3] - a[0] * b[0] - a[1] * b[1] - a[2] * b[2];
+    out[0] = x; out[1] = y; out[2] = z; out[3] = w;
+  }
+
+  // a moves a fraction t of the way towards b, in place
+  function slerpTowards(a, b, t) {
+    var cos = dot(a, b), sign = cos < 0 ? -1 : 1;
+    cos *= sign;
+    var wa = 1 - t, wb = t * sign;
+    if (cos < 0.9995) {
+      var theta = Math.acos(cos), sin = Math.sin(theta);
+      wa = Math.sin(wa * theta) / sin;
+      wb = sign * Math.sin(t * theta) / sin;
+    }
+    for (var i = 0; i < 4; i++) a[i] = wa * a[i] + wb * b[i];
+    normalize(a);
+  }
+
+  function updateVelocity(dt) {
+    // step = raw * conjugate(previousRaw), the world-frame rotation since the last sample
+    previousRaw[0] = -previousRaw[0]; previousRaw[1] = -previousRaw[1]; previousRaw[2] = -previousRaw[2];
+    multiply(step, raw, previousRaw);
+    if (step[3] < 0) { step[0] = -step[0]; step[1] = -step[1]; step[2] = -step[2]; step[3] = -step[3]; }
+    var half = Math.acos(Math.min(1, step[3])), sin = Math.sin(half);
+    var scale = sin > 1e-9 ? 2 * half / sin / dt : 0;
+    for (var i = 0; i < 3; i++) omega[i] += (step[i] * scale - omega[i]) * 0.5;
+  }
+
+  return {
+    // Schedule one more frame this long after the last reading, so the final pose is drawn unpredicted
+    predictionWindowMs: PREDICTION_WINDOW_MS,
+
+    // Feed one sensor reading (degrees, event timestamp in ms)
+    push: function(alpha, beta, gamma, time) {
+      copy(previousRaw, raw);
+      fromAngles(raw, alpha, beta, gamma);
+      var dt = time - lastTime;
+      if (!started) {
+        copy(smoothed, raw);
+        started = true;
+      } else if (dt > 0 && dt < PREDICTION_WINDOW_MS) {
+        updateVelocity(dt);
+      } else {
+        omega[0] = omega[1] = omega[2] = 0;
+      }
+      lastTime = time;
+      if (angleBetween(smoothed, raw) < deadBand) {
+        omega[0] = omega[1] = omega[2] = 0; // holding still: sensor noise must not be extrapolated
+        return;
+      }
+      slerpTowards(smoothed, raw, smoothingMs > 0 && dt > 0 ? 1 - Math.exp(-dt / smoothingMs) : 1);
+    },
+
+    // Jump straight to an orientation, e.g. from manual sliders
+    reset: function(alpha, beta, gamma) {
+      fromAngles(raw, alpha, beta, gamma);
+      copy(smoothed, raw);
+      omega[0] = omega[1] = omega[2] = 0;
+      started = true;
+      force = true;
+    },
+
+    // Next emission even if the view barely moved, e.g. after new data or a resize
+    invalidate: function() { force = true; },
+
+    // Predicted orientation quaternion [x, y, z, w] at `now`, or null when the view would
+    // move by less than the pixel threshold given the projection's px per radian
+    sample: function(now, pixelsPerRadian) {
+      var horizon = now - lastTime < PREDICTION_WINDOW_MS ? predictionMs : 0;
+      var rate = Math.sqrt(omega[0] * omega[0] + omega[1] * omega[1] + omega[2] * omega[2]);
+      var angle = rate * horizon;
+      if (angle > 1e-9) {
+        var s = Math.sin(angle / 2) / rate;
+        step[0] = omega[0] * s; step[1] = omega[1] * s; step[2] = omega[2] * s; step[3] = Math.cos(angle / 2);
+        multiply(predicted, step, smoothed);
+      } else {
+        copy(predicted, smoothed);
+      }
+      if (!force && angleBetween(predicted, emitted) * pixelsPerRadian < pixelThreshold) return null;
+      force = false;
+      copy(emitted, predicted);
+      return emitted;
+    }
+  };
+}
+</script>
+"""
+
+
+def script(smoothing_ms=SMOOTHING_MS, dead_band_degrees=DEAD_BAND_DEGREES,
+           prediction_ms=PREDICTION_MS, pixel_threshold=PIXEL_THRESHOLD):
+    """<script> block defining OrientationFilter with these defaults"""
+    return (
+        FILTER_JS
+        .replace("__SMOOTHING_MS__", repr(float(smoothing_ms)))
+        .replace("__DEAD_BAND_DEGREES__", repr(float(dead_band_degrees)))
+        .replace("__PREDICTION_MS__", repr(float(prediction_ms)))
+        .replace("__PIXEL_THRESHOLD__", repr(float(pixel_threshold)))
+    )
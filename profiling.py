@@ -0,0 +1,147 @@
+import contextvars
+import cProfile
+import functools
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+METRICS_FILE = os.environ.get("AUDIO_METRICS_FILE")
+PROFILE_LOG = os.environ.get("AUDIO_PROFILE_LOG")  # JSON lines of stage records; stderr when unset
+
+logger = logging.getLogger("audio.profile")
+if not logger.handlers:  # emit the records even when the app never configures logging
+    _handler = logging.FileHandler(PROFILE_LOG) if PROFILE_LOG else logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_active = contextvars.ContextVar("active_profiler", default=None)
+_totals = {}
+_totals_lock = threading.Lock()
+
+
+def current_rss():
+    """Resident set size of this process in bytes"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return peak_rss()
+
+
+def peak_rss():
+    """Peak resident set size in bytes since the last reset_peak_rss()"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def reset_peak_rss():
+    """Reset the kernel's peak RSS counter so the next stage gets its own peak (Linux only)"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class Profiler:
+    """Collect wall time, CPU time and peak RSS for each pipeline stage of one run"""
+
+    def __init__(self, cprofile=False):
+        self.records = []
+        self._cprofile = cProfile.Profile() if cprofile else None
+        self._token = None
+
+    def __enter__(self):
+        self._token = _active.set(self)
+        if self._cprofile:
+            self._cprofile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._cprofile:
+            self._cprofile.disable()
+        _active.reset(self._token)
+        if METRICS_FILE:
+            write_metrics(METRICS_FILE)
+
+    def record(self, stage, wall, cpu, rss):
+        record = {"stage": stage, "wall_seconds": wall, "cpu_seconds": cpu, "peak_rss_bytes": rss}
+        self.records.append(record)
+        logger.info(json.dumps(record))
+        with _totals_lock:
+            totals = _totals.setdefault(stage, {"runs": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0, "peak_rss_bytes": 0})
+            totals["runs"] += 1
+            totals["wall_seconds"] += wall
+            totals["cpu_seconds"] += cpu
+            totals["peak_rss_bytes"] = max(totals["peak_rss_bytes"], rss)
+
+    def cprofile_dump(self):
+        """The run's cProfile stats in pstats format (open with snakeviz or pstats), or None"""
+        if not self._cprofile:
+            return None
+        with tempfile.NamedTemporaryFile(suffix=".prof") as f:
+            self._cprofile.dump_stats(f.name)
+            with open(f.name, "rb") as dump:
+                return dump.read()
+
+
+def stage(name):
+    """Decorator that records a call as pipeline stage `name` in the active Profiler"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profiler = _active.get()
+            if profiler is None:
+                return func(*args, **kwargs)
+            exact_peak = reset_peak_rss()
+            wall, cpu = time.perf_counter(), time.process_time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                rss = peak_rss() if exact_peak else current_rss()
+                profiler.record(name, time.perf_counter() - wall, time.process_time() - cpu, rss)
+        return wrapper
+    return decorator
+
+
+METRIC_FAMILIES = (
+    ("audio_stage_runs_total", "counter", "runs"),
+    ("audio_stage_wall_seconds_total", "counter", "wall_seconds"),
+    ("audio_stage_cpu_seconds_total", "counter", "cpu_seconds"),
+    ("audio_stage_peak_rss_bytes", "gauge", "peak_rss_bytes"),
+)
+
+
+def prometheus_text():
+    """Stage totals of this process in the Prometheus text exposition format"""
+    lines = []
+    with _totals_lock:
+        for metric, kind, field in METRIC_FAMILIES:
+            lines.append(f"# TYPE {metric} {kind}")
+            for name, totals in sorted(_totals.items()):
+                lines.append(f'{metric}{{stage="{name}",pid="{os.getpid()}"}} {totals[field]}')
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(path):
+    """Write prometheus_text() for node_exporter's textfile collector, one file per process"""
+    root, ext = os.path.splitext(path)
+    target = f"{root}.{os.getpid()}{ext or '.prom'}"
+    tmp = f"{target}.tmp"
+    with open(tmp, "w") as f:
+        f.write(prometheus_text())
+    os.replace(tmp, target)
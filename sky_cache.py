@@ -0,0 +1,138 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+import streamlit as st
+import ephemeris
+import sky_catalogue
+
+CELL_DEGREES = float(os.environ.get("SKY_CELL_DEGREES", 0.5))
+TTL_SECONDS = float(os.environ.get("SKY_TTL_SECONDS", 60))
+MAX_ENTRIES = int(os.environ.get("SKY_CACHE_ENTRIES", 10000))
+RENDERERS = ("canvas", "dom")
+DEFAULT_RENDERER = os.environ.get("AR_RENDERER", "canvas")
+
+logger = logging.getLogger("sky_cache")
+
+if DEFAULT_RENDERER not in RENDERERS:
+    logger.warning("AR_RENDERER=%r is not one of %s, falling back to dom", DEFAULT_RENDERER, ", ".join(RENDERERS))
+    DEFAULT_RENDERER = "dom"
+
+
+class PositionCache:
+    """Planet positions shared by every observer in the same lat/lon cell and time bucket"""
+
+    def __init__(self, cell_degrees=CELL_DEGREES, ttl_seconds=TTL_SECONDS, max_entries=MAX_ENTRIES):
+        self.cell_degrees = cell_degrees
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, latitude, longitude, timestamp):
+        cell = self.cell_degrees
+        return (
+            int(np.floor(latitude / cell)),
+            int(np.floor(((longitude + 180.0) % 360.0) / cell)),
+            int(timestamp // self.ttl_seconds),
+        )
+
+    def center(self, key):
+        """Cell centre and bucket midpoint the cached positions were computed for"""
+        lat_cell, lon_cell, bucket = key
+        cell = self.cell_degrees
+        latitude = min((lat_cell + 0.5) * cell, 90.0)
+        longitude = (lon_cell + 0.5) * cell - 180.0
+        return latitude, longitude, (bucket + 0.5) * self.ttl_seconds
+
+    def bucket_start(self, timestamp=None):
+        """Start of the time bucket `timestamp` falls in; stable across reruns within one bucket"""
+        timestamp = time.time() if timestamp is None else timestamp
+        return timestamp // self.ttl_seconds * self.ttl_seconds
+
+    def get(self, latitude, longitude, timestamp=None):
+        """Planet records for an observer, computed once per cell and time bucket"""
+        timestamp = time.time() if timestamp is None else timestamp
+        key = self.key(latitude, longitude, timestamp)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        self.prefetch([key])
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry if entry is not None else ephemeris.planet_positions(*self.center(key))
+
+    def prefetch(self, keys):
+        """Compute many cells in one vectorized ephemeris call and store them"""
+        keys = list(keys)
+        if not keys:
+            return
+        latitude, longitude, timestamp = (np.array(values) for values in zip(*(self.center(key) for key in keys)))
+        azimuth, altitude = ephemeris.horizontal(latitude, longitude, timestamp)
+        with self._lock:
+            for index, key in enumerate(keys):
+                self._entries[key] = ephemeris.records(azimuth[:, index], altitude[:, index])
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def prefetch_region(self, south, west, north, east, timestamp=None):
+        """Warm every cell of a lat/lon box for the current time bucket in one computation"""
+        timestamp = time.time() if timestamp is None else timestamp
+        cell = self.cell_degrees
+        latitudes = np.arange(south, north, cell)
+        longitudes = np.arange(west, east, cell)
+        self.prefetch({self.key(lat, lon, timestamp) for lat in latitudes for lon in longitudes})
+
+    def max_error(self, samples=500, seed=0):
+        """Largest altitude/azimuth error in degrees from serving random observers their cell's positions"""
+        rng = np.random.default_rng(seed)
+        latitude = rng.uniform(-60, 60, samples)
+        longitude = rng.uniform(-180, 180, samples)
+        timestamp = time.time() + rng.uniform(0, self.ttl_seconds, samples)
+        centers = np.array([self.center(self.key(*point)) for point in zip(latitude, longitude, timestamp)]).T
+        exact_az, exact_alt = ephemeris.horizontal(latitude, longitude, timestamp)
+        cell_az, cell_alt = ephemeris.horizontal(*centers)
+        az_error = np.abs((exact_az - cell_az + 180.0) % 360.0 - 180.0) * np.cos(np.radians(exact_alt))
+        return {"altitude": float(np.abs(exact_alt - cell_alt).max()), "azimuth": float(az_error.max())}
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "hit_rate": self.hits / total if total else 0.0,
+            "cell_degrees": self.cell_degrees,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+@st.cache_resource
+def get_position_cache():
+    """Position cache shared by every session of this server"""
+    return PositionCache()
+
+
+@st.cache_resource
+def get_sky_catalogue():
+    """Star and deep-sky payload, built once per server and shared by every session"""
+    return sky_catalogue.payload(sky_catalogue.build())
+
+
+def renderer_mode():
+    """Marker renderer picked in the sidebar: one canvas pass, or one DOM element per marker"""
+    return st.sidebar.selectbox(
+        "Renderer", RENDERERS, index=RENDERERS.index(DEFAULT_RENDERER),
+        help="canvas draws every marker and label in a single pass; dom is the fallback"
+    )
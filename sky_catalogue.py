@@ -0,0 +1,153 @@
+import base64
+import logging
+import os
+import time
+import numpy as np
+import ephemeris
+
+STAR_MAX_MAGNITUDE = float(os.environ.get("SKY_STAR_MAX_MAGNITUDE", 6.5))
+DSO_MAX_MAGNITUDE = float(os.environ.get("SKY_DSO_MAX_MAGNITUDE", 10.0))
+INDEX_CELL_DEGREES = float(os.environ.get("SKY_INDEX_CELL_DEGREES", 6.0))
+
+STAR, DEEP_SKY = 0, 1
+
+logger = logging.getLogger("sky_catalogue")
+
+
+def load_stars(max_magnitude=STAR_MAX_MAGNITUDE):
+    """RA, Dec (radians) and Hp magnitude of Hipparcos stars brighter than max_magnitude"""
+    import hipparcos_catalog
+
+    # hip2.dat (ESA I/311) columns: HIP, Sn, So, Nc, RArad, DErad, ... Hpmag is the 20th
+    ra, dec, magnitude = np.loadtxt(hipparcos_catalog.catalog_path(), usecols=(4, 5, 19), unpack=True)
+    keep = magnitude <= max_magnitude
+    return ra[keep], dec[keep], magnitude[keep]
+
+
+def load_deep_sky(max_magnitude=DSO_MAX_MAGNITUDE):
+    """RA, Dec (radians), V (else B) magnitude and name of OpenNGC objects brighter than max_magnitude"""
+    from pyongc import ongc
+
+    ra, dec, magnitude, names = [], [], [], []
+    for dso in ongc.listObjects(uptobmag=max_magnitude + 1):
+        coords = dso.rad_coords
+        bmag, vmag = dso.magnitudes[:2]
+        mag = vmag if vmag is not None else bmag
+        if coords is None or mag is None or mag > max_magnitude or dso.type == "Duplicated record":
+            continue
+        messier = dso.identifiers[0]
+        ra.append(coords[0])
+        dec.append(coords[1])
+        magnitude.append(mag)
+        names.append(f"M{int(messier[1:])}" if messier else dso.name)
+    return np.array(ra), np.array(dec), np.array(magnitude), names
+
+
+def unit_vectors(ra, dec):
+    """Equatorial unit vectors (x towards RA 0, z towards the north pole), shaped (..., 3)"""
+    ra, dec = np.broadcast_arrays(ra, dec)
+    return np.stack([np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec)], axis=-1)
+
+
+def grid_cells(cell_degrees=INDEX_CELL_DEGREES):
+    """Roughly equal-area sky grid: dec bands split into as many RA cells as their widest edge needs"""
+    bands = int(np.ceil(180.0 / cell_degrees))
+    edges = np.linspace(-np.pi / 2, np.pi / 2, bands + 1)
+    widest = np.cos(np.minimum(np.abs(edges[:-1]), np.abs(edges[1:])) * (np.sign(edges[:-1]) == np.sign(edges[1:])))
+    per_band = np.maximum(1, np.ceil(360.0 * widest / cell_degrees)).astype(int)
+    return edges, per_band, np.concatenate([[0], np.cumsum(per_band)])
+
+
+def cell_of(ra, dec, edges, per_band, offsets):
+    band = np.clip(np.searchsorted(edges, dec, side="right") - 1, 0, len(per_band) - 1)
+    column = np.minimum((np.mod(ra, 2 * np.pi) / (2 * np.pi) * per_band[band]).astype(int), per_band[band] - 1)
+    return offsets[band] + column
+
+
+def cell_geometry(edges, per_band, offsets):
+    """Centre unit vector and bounding angular radius of every grid cell"""
+    centers, radii = [], []
+    for band, columns in enumerate(per_band):
+        ra_edges = np.linspace(0, 2 * np.pi, columns + 1)
+        ra_mid = (ra_edges[:-1] + ra_edges[1:]) / 2
+        dec_mid = np.full(columns, (edges[band] + edges[band + 1]) / 2)
+        center = unit_vectors(ra_mid, dec_mid)
+        # corners and edge midpoints of each cell; the farthest one bounds the cell
+        ras = np.stack([ra_edges[:-1], ra_mid, ra_edges[1:]])
+        decs = np.array([edges[band], dec_mid[0], edges[band + 1]])
+        outline = unit_vectors(ras[:, None, :], decs[None, :, None]).reshape(-1, columns, 3)
+        cos = np.clip(np.einsum("kcj,cj->kc", outline, center), -1.0, 1.0)
+        centers.append(center)
+        radii.append(np.arccos(cos.min(axis=0)))
+    return np.concatenate(centers), np.concatenate(radii)
+
+
+NO_STARS = (np.empty(0), np.empty(0), np.empty(0))
+NO_DEEP_SKY = NO_STARS + ((),)
+
+
+def load_or_empty(loader, max_magnitude, empty):
+    """Run a catalogue loader; if its package or data is missing, log it and return `empty`"""
+    try:
+        return loader(max_magnitude)
+    except Exception:
+        logger.warning("%s failed, its objects are left out of the sky layer", loader.__name__, exc_info=True)
+        return empty
+
+
+def build(star_max_magnitude=STAR_MAX_MAGNITUDE, dso_max_magnitude=DSO_MAX_MAGNITUDE,
+          cell_degrees=INDEX_CELL_DEGREES, stars=None, deep_sky=None):
+    """Stars and deep-sky objects as float32 unit vectors and magnitudes, sorted by grid cell
+
+    stars (ra, dec, magnitude) and deep_sky (ra, dec, magnitude, names) default to
+    the Hipparcos and OpenNGC catalogues; a catalogue that fails to load is empty.
+    """
+    star_ra, star_dec, star_mag = load_or_empty(load_stars, star_max_magnitude, NO_STARS) if stars is None else stars
+    dso_ra, dso_dec, dso_mag, dso_names = (
+        load_or_empty(load_deep_sky, dso_max_magnitude, NO_DEEP_SKY) if deep_sky is None else deep_sky
+    )
+    ra = np.concatenate([star_ra, dso_ra])
+    dec = np.concatenate([star_dec, dso_dec])
+    magnitude = np.concatenate([star_mag, dso_mag])
+    kind = np.concatenate([np.full(len(star_ra), STAR), np.full(len(dso_ra), DEEP_SKY)]).astype(np.uint8)
+    names = [""] * len(star_ra) + list(dso_names)
+
+    edges, per_band, offsets = grid_cells(cell_degrees)
+    cells = cell_of(ra, dec, edges, per_band, offsets)
+    order = np.lexsort((magnitude, cells))  # by cell, brightest first within a cell
+    centers, radii = cell_geometry(edges, per_band, offsets)
+    return {
+        "vectors": unit_vectors(ra[order], dec[order]).astype(np.float32),
+        "magnitudes": magnitude[order].astype(np.float32),
+        "kinds": kind[order],
+        "labels": [(index, names[i]) for index, i in enumerate(order) if names[i]],
+        "cell_start": np.searchsorted(cells[order], np.arange(offsets[-1] + 1)).astype(np.uint32),
+        "cell_centers": centers.astype(np.float32),
+        "cell_radii": radii.astype(np.float32),
+    }
+
+
+def _b64(array):
+    return base64.b64encode(np.ascontiguousarray(array).astype(array.dtype.newbyteorder("<")).tobytes()).decode()
+
+
+def payload(catalogue):
+    """JSON-ready form of build(): little-endian typed-array buffers as base64 strings"""
+    return {
+        "count": len(catalogue["magnitudes"]),
+        "cells": len(catalogue["cell_radii"]),
+        "vectors": _b64(catalogue["vectors"]),
+        "magnitudes": _b64(catalogue["magnitudes"]),
+        "kinds": _b64(catalogue["kinds"]),
+        "cellStart": _b64(catalogue["cell_start"]),
+        "cellCenters": _b64(catalogue["cell_centers"]),
+        "cellRadii": _b64(catalogue["cell_radii"]),
+        "labels": catalogue["labels"],
+    }
+
+
+def observer_frame(latitude, longitude, timestamp=None):
+    """Latitude and local sidereal angle (radians) the client needs to turn equatorial vectors into az/alt"""
+    timestamp = time.time() if timestamp is None else timestamp
+    sidereal = ephemeris.sidereal_angle(ephemeris.julian_date(timestamp)) + np.radians(longitude)
+    return {"latitude": float(np.radians(latitude)), "sidereal": float(sidereal), "timestamp": timestamp}
@@ -0,0 +1,164 @@
+import subprocess
+import threading
+import numpy as np
+
+STDERR_TAIL_BYTES = 64 * 1024
+
+
+def open_decoder(source, samplerate, channels, max_seconds=None):
+    """Start ffmpeg decoding a path or in-memory bytes to float32 PCM on its stdout"""
+    from_bytes = isinstance(source, (bytes, bytearray, memoryview))
+    command = ["ffmpeg", "-loglevel", "error", "-nostats", "-i", "pipe:0" if from_bytes else str(source)]
+    if max_seconds:
+        command += ["-t", str(max_seconds)]
+    command += ["-f", "f32le", "-ac", str(channels), "-ar", str(samplerate), "pipe:1"]
+    process = subprocess.Popen(
+        command,
+        stdin=subprocess.PIPE if from_bytes else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE
+    )
+    if from_bytes:
+        def feed():
+            try:
+                process.stdin.write(source)
+            except (BrokenPipeError, ValueError):
+                pass
+            finally:
+                try:
+                    process.stdin.close()
+                except BrokenPipeError:
+                    pass
+        threading.Thread(target=feed, daemon=True).start()
+    _drain_stderr(process)
+    return process
+
+
+def _drain_stderr(process):
+    """Read ffmpeg's stderr on a daemon thread, keeping only the last STDERR_TAIL_BYTES
+
+    A damaged upload can make ffmpeg log far more than the pipe buffer holds while
+    still exiting 0; left unread, ffmpeg blocks on stderr and the reader on stdout.
+    """
+    tail = bytearray()
+
+    def drain():
+        try:
+            for chunk in iter(lambda: process.stderr.read1(STDERR_TAIL_BYTES), b""):
+                tail.extend(chunk)
+                del tail[:-STDERR_TAIL_BYTES]
+        except ValueError:  # closed by _close_decoder
+            pass
+
+    process.stderr_tail = tail
+    process.stderr_thread = threading.Thread(target=drain, daemon=True)
+    process.stderr_thread.start()
+
+
+def _check_decoder(process):
+    if process.wait() != 0:
+        process.stderr_thread.join()
+        raise RuntimeError(f"ffmpeg could not decode the audio: {bytes(process.stderr_tail).decode(errors='replace')}")
+
+
+def _close_decoder(process):
+    if process.poll() is None:
+        process.kill()
+        process.wait()
+    process.stderr_thread.join()
+    process.stdout.close()
+    process.stderr.close()
+
+
+def decode_audio(source, samplerate, channels, max_seconds=None):
+    """Decode a path or in-memory bytes into a float32 array shaped (channels, frames)"""
+    process = open_decoder(source, samplerate, channels, max_seconds)
+    try:
+        data = process.stdout.read()
+        _check_decoder(process)
+    finally:
+        _close_decoder(process)
+    return np.frombuffer(data, dtype=np.float32).reshape(-1, channels).T.copy()
+
+
+def decode_blocks(source, samplerate, channels, block_frames):
+    """Decode with one ffmpeg process and yield float32 blocks shaped (channels, frames)"""
+    process = open_decoder(source, samplerate, channels)
+    block_bytes = block_frames * channels * 4
+    try:
+        while True:
+            data = process.stdout.read(block_bytes)
+            if not data:
+                break
+            yield np.frombuffer(data, dtype=np.float32).reshape(-1, channels).T
+        _check_decoder(process)
+    finally:
+        _close_decoder(process)
+
+
+def overlapping_windows(blocks, overlap):
+    """Prefix each block with the last `overlap` frames of the window before it"""
+    previous = None
+    for block in blocks:
+        if previous is not None and overlap:
+            block = np.concatenate([previous[:, -overlap:], block], axis=1)
+        previous = block
+        yield block
+
+
+class OverlapAdd:
+    """Crossfade consecutive overlapping windows back into one continuous signal"""
+
+    def __init__(self, overlap):
+        self.overlap = overlap
+        self._tail = None
+
+    def push(self, window):
+        """Add the next window and return the frames no later window can change"""
+        window = np.array(window, dtype=np.float32)
+        if self._tail is not None:
+            n = min(self._tail.shape[-1], window.shape[-1])
+            fade = np.linspace(0.0, 1.0, n, dtype=np.float32)
+            window[..., :n] *= fade
+            window[..., :n] += self._tail[..., :n] * (1.0 - fade)
+        split = max(window.shape[-1] - self.overlap, 0)
+        self._tail = window[..., split:] if self.overlap else None
+        return window[..., :split]
+
+    def flush(self):
+        """Return the last held-back frames, or None when nothing is pending"""
+        tail, self._tail = self._tail, None
+        return tail
+
+
+class Mp3Encoder:
+    """Pipe float blocks into an ffmpeg MP3 encoder as soon as they are produced"""
+
+    def __init__(self, path, samplerate, channels):
+        self._process = subprocess.Popen(
+            [
+                "ffmpeg", "-loglevel", "error", "-y",
+                "-f", "s16le", "-ar", str(samplerate), "-ac", str(channels), "-i", "-",
+                "-f", "mp3", str(path)
+            ],
+            stdin=subprocess.PIPE
+        )
+
+    def write(self, block):
+        pcm = (np.clip(block, -1.0, 1.0) * 32767).astype(np.int16).T
+        self._process.stdin.write(pcm.tobytes())
+
+    def close(self):
+        self._process.stdin.close()
+        if self._process.wait() != 0:
+            raise RuntimeError("ffmpeg failed to encode MP3")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._process.kill()
+            self._process.wait()
@@ -0,0 +1,39 @@
+from functools import lru_cache
+
+UV_MAX = 11.0
+
+# matplotlib's RdYlGn sampled at 11 stops, reversed so low UV (green) sits on the left
+GRADIENT_STOPS = [
+    "#006837", "#199750", "#66bd63", "#a5d86a", "#d9ef8b", "#feffbe",
+    "#fee08b", "#fdad60", "#f46d43", "#d62f27", "#a50026",
+]
+GRADIENT_CSS = f"linear-gradient(to right, {', '.join(GRADIENT_STOPS)})"
+
+
+def uv_color(uv_index):
+    if uv_index <= 2:
+        return 'green'
+    elif uv_index <= 5:
+        return 'yellow'
+    elif uv_index <= 7:
+        return 'orange'
+    return 'red'
+
+
+@lru_cache(maxsize=256)
+def _gauge_html(uv_index):
+    color = uv_color(uv_index)
+    position = min(max(uv_index / UV_MAX, 0.0), 1.0) * 100
+    return f"""
+<div style="position:relative;max-width:600px;margin:8px 0 16px 0;">
+  <div style="height:48px;border-radius:4px;background:{GRADIENT_CSS};"></div>
+  <div style="position:absolute;left:{position:.1f}%;top:46px;transform:translateX(-50%);
+              color:{color};font-size:20px;line-height:1;">&#9660;</div>
+  <div style="margin-top:26px;text-align:center;color:{color};font-size:15px;">UV Index: {uv_index:g}</div>
+</div>
+"""
+
+
+def gauge_html(uv_index):
+    """HTML gauge: a static CSS gradient with the pointer placed for this UV index, cached per 0.1"""
+    return _gauge_html(round(float(uv_index), 1))